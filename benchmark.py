@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Roda sem tela: a plataforma offscreen do Qt precisa ser escolhida antes de importar o PyQt5
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QFileDialog
+
+from cache import CACHE
+from drugs import BP_CURVES, DRUG_NAMES
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmark_baseline.json")
+DEFAULT_THRESHOLD = 0.25  # regressão: mais de 25% acima da referência, já descontada a calibração
+
+# Início a frio num processo novo: importação, janela, primeira pintura e gráficos
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+import main
+app = QApplication([])
+simulator = main.HeartSimulator()
+simulator.show()
+while simulator.blood_pressure_graph is None:
+    app.processEvents()
+print(time.perf_counter() - start)
+"""
+
+
+def calibration_loop():
+    # Carga fixa parecida com a dos quadros (laço Python com numpy em vetores
+    # pequenos); mede a velocidade da máquina naquele momento
+    x = np.linspace(0, 10, 100)
+    total = 0.0
+    for k in range(100):
+        total += float(np.interp(x, x, x + k).sum())
+    return total
+
+
+def timed(function, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        function()
+    return (time.perf_counter() - start) / number
+
+
+def collect(sample, repeat, number):
+    # Segundos por chamada em cada repetição; mínimo e mediana ficam no
+    # relatório. Antes de cada repetição roda a calibração, e a comparação usa
+    # a mediana das razões entre as duas: medidas vizinhas veem a máquina no
+    # mesmo estado, então uma máquina mais lenta ou ocupada naquele momento
+    # não conta como regressão, e a mediana ignora as repetições interrompidas
+    times, ratios = [], []
+    for _ in range(repeat):
+        calibration = timed(calibration_loop, 20)
+        times.append(sample())
+        ratios.append(times[-1] / calibration)
+    return dict(median=float(np.median(times)), min=float(np.min(times)), relative=float(np.median(ratios)),
+                repeat=repeat, number=number)
+
+
+def measure(function, repeat=15, number=1):
+    function()  # aquecimento: caches, alocações e compilação de caminhos do matplotlib
+    return collect(lambda: timed(function, number), repeat, number)
+
+
+def build_simulator(app):
+    import main
+    simulator = main.HeartSimulator()
+    simulator.resize(1400, 1000)
+    simulator.show()
+    simulator.create_graphs()
+    app.processEvents()
+    return simulator
+
+
+def bench_effects(simulator):
+    # Curva de PA de cada droga do catálogo numa grade de 100 pontos
+    x = np.linspace(0, 10, 100)
+    return measure(lambda: [BP_CURVES.evaluate_one(drug, x) for drug in DRUG_NAMES], number=200)
+
+
+def bench_heart_rate_frame(simulator):
+    graph = simulator.heart_rate_graph
+    graph.start_animation(np.linspace(80, 180, 100))
+    frames = iter(range(10 ** 9))
+
+    def frame():
+        graph.current_time = (next(frames) % 100 + 1) / 10
+        graph.update_animation()
+    return measure(frame, number=100)
+
+
+def bench_blood_pressure_frame(simulator):
+    graph = simulator.blood_pressure_graph
+    graph.apply_drug("Adrenalina 20mcg")
+    graph.update_blood_pressure(graph.y)
+    frames = iter(range(10 ** 9))
+
+    def frame():
+        graph.draw_graph((next(frames) % 100 + 1) / 10)
+    return measure(frame, number=100)
+
+
+def bench_live_frame(simulator):
+    # Janela ao vivo de 10 s a 1 kHz nos dois gráficos. A pintura é processada
+    # dentro da medida, pois os traços QPainter (SIMULADOR_GRAFICOS=qt) só a agendam
+    app = QApplication.instance()
+    t = np.arange(10000) / 1000
+    bp, hr = 120 + 20 * np.sin(2 * np.pi * 1.5 * t), 100 + 5 * np.sin(2 * np.pi * 0.1 * t)
+    graphs = (simulator.blood_pressure_graph, simulator.heart_rate_graph)
+    for graph in graphs:
+        graph.start_live(10.0)
+    shift = iter(range(10 ** 9))
+
+    def frame():
+        k = next(shift) % 1000
+        for graph, y in zip(graphs, (bp, hr)):
+            graph.show_live(t[k:] - t[k], y[k:])
+        app.processEvents()
+    return measure(frame, number=100)
+
+
+def bench_heartbeat(simulator):
+    return measure(simulator.heartbeat_animation.update_image, number=500)
+
+
+def bench_startup(repeat=5):
+    def start():
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True)
+        return float(output.stdout.split()[-1])
+    return collect(start, repeat, 1)
+
+
+def bench_export(simulator):
+    path = os.path.join(tempfile.mkdtemp(), "grafico.pdf")
+    QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (path, ""))
+    simulator.drug_checkboxes["Adrenalina 20mcg"].setChecked(True)
+    simulator.apply_selected_drugs()
+    simulator.clock.seek(simulator.clock.end_time)
+    app = QApplication.instance()
+
+    def export():
+        # Sem cache, para medir a renderização do PDF e não a cópia dos bytes;
+        # espera a thread de exportação e a entrega dos seus sinais
+        CACHE.clear()
+        simulator.save_graph_to_pdf()
+        simulator.export_thread.wait()
+        while simulator.export_thread is not None:
+            app.processEvents()
+    return measure(export, repeat=5)
+
+
+BENCHMARKS = {
+    "effects": bench_effects,
+    "heart_rate_frame": bench_heart_rate_frame,
+    "blood_pressure_frame": bench_blood_pressure_frame,
+    "live_frame": bench_live_frame,
+    "heartbeat_frame": bench_heartbeat,
+    "export_pdf": bench_export,
+}
+
+
+def run(selected):
+    # As imagens do coração são carregadas com caminhos relativos à raiz do projeto
+    os.chdir(ROOT)
+    app = QApplication.instance() or QApplication([])
+    simulator = build_simulator(app)
+    results = {}
+    for name in selected:
+        results[name] = bench_startup() if name == "startup" else BENCHMARKS[name](simulator)
+        print(f"{name:<22} {results[name]['min'] * 1000:10.3f} ms (mediana {results[name]['median'] * 1000:.3f} ms)", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Devolve (nome, razão) de cada medida acima do limiar em relação à
+    # referência. Uma regressão de verdade aparece tanto no tempo mínimo quanto
+    # no tempo relativo à calibração; cada um sozinho oscila com o estado da
+    # máquina, então vale a menor das duas razões
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        ratio = result["min"] / reference["min"]
+        if "relative" in reference:
+            ratio = min(ratio, result["relative"] / reference["relative"])
+        limit = 1 + baseline.get("thresholds", {}).get(name, threshold)
+        if ratio > limit:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    names = list(BENCHMARKS) + ["startup"]
+    parser = argparse.ArgumentParser(description="Medição dos caminhos críticos do simulador, sem tela (Qt offscreen).")
+    parser.add_argument("benchmarks", nargs="*", help=f"Medidas a executar ({', '.join(names)}). Padrão: todas.")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Arquivo JSON com os resultados.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Resultados de referência para comparação.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Aumento relativo tolerado do tempo mínimo.")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como nova referência.")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(names)
+    if unknown:
+        parser.error(f"Medidas desconhecidas: {', '.join(sorted(unknown))}")
+
+    output, baseline_path = os.path.abspath(args.output), os.path.abspath(args.baseline)
+
+    results = run(args.benchmarks or names)
+    report = dict(platform=platform.platform(), python=platform.python_version(), results=results)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        # Limiares por medida podem ser ajustados à mão no arquivo de
+        # referência; regravar os resultados mantém os que já existem
+        previous = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                previous = json.load(f)
+        report["thresholds"] = previous.get("thresholds", {})
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+
+    if not os.path.exists(baseline_path):
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, ratio in regressions:
+        print(f"Regressão em {name}: {ratio:.2f}× a referência", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+def freeze(value):
+    # Arrays em cache são compartilhados entre chamadas; somente leitura evita
+    # que um chamador altere no lugar o resultado de outro
+    for item in value if isinstance(value, (tuple, list)) else (value,):
+        if isinstance(item, np.ndarray):
+            item.flags.writeable = False
+    return value
+
+
+def value_size(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(value_size(item) for item in value)
+    return 64
+
+
+class LRUCache:
+    # Memória limitada em bytes; ao passar do limite, descarta os itens usados
+    # há mais tempo
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key][0]
+
+    def put(self, key, value):
+        if key in self.items:
+            self.size -= self.items.pop(key)[1]
+        size = value_size(value)
+        if size > self.max_bytes:
+            return
+        self.items[key] = (value, size)
+        self.size += size
+        self.evict()
+
+    def evict(self):
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.items.popitem(last=False)
+            self.size -= evicted
+
+    def clear(self):
+        self.items.clear()
+        self.size = 0
+
+
+class DiskCache:
+    # Arrays em .npz e bytes (quadros, PDFs) em .bin, nomeados pelo hash da
+    # chave; sobrevive entre execuções
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode("utf-8")).hexdigest())
+
+    def get(self, key):
+        path = self.path(key)
+        if os.path.exists(path + ".bin"):
+            with open(path + ".bin", "rb") as f:
+                return f.read()
+        if os.path.exists(path + ".npz"):
+            with np.load(path + ".npz", allow_pickle=False) as data:
+                return tuple(data[f"arr_{i}"] for i in range(len(data.files)))
+        return None
+
+    def put(self, key, value):
+        path = self.path(key)
+        # Grava num arquivo temporário e renomeia, para nunca deixar um item pela metade
+        if isinstance(value, (bytes, bytearray)):
+            with open(path + ".tmp", "wb") as f:
+                f.write(value)
+            os.replace(path + ".tmp", path + ".bin")
+        elif isinstance(value, tuple) and all(isinstance(item, np.ndarray) for item in value):
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, *value)
+            os.replace(path + ".tmp", path + ".npz")
+
+
+class TieredCache:
+    def __init__(self, max_bytes=64 * 2 ** 20, directory=None):
+        self.memory = LRUCache(max_bytes)
+        self.disk = DiskCache(directory) if directory else None
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_bytes=None, directory=None):
+        if max_bytes is not None:
+            self.memory.max_bytes = max_bytes
+            self.memory.evict()
+        if directory is not None:
+            self.disk = DiskCache(directory) if directory else None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, freeze(value))
+        return value
+
+    def put(self, key, value):
+        value = freeze(value)
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return self.put(key, compute())
+
+    def clear(self):
+        self.memory.clear()
+
+
+# Cache compartilhado pelas curvas e pelos quadros exportados. O limite de
+# memória (MB) e a pasta da camada em disco podem vir do ambiente.
+CACHE = TieredCache(int(float(os.environ.get("SIMULADOR_CACHE_MB", "64")) * 2 ** 20),
+                    os.environ.get("SIMULADOR_CACHE_DIR") or None)
@@ -0,0 +1,131 @@
+import bisect
+import itertools
+
+
+class TimelineEvent:
+    __slots__ = ("time", "order", "callback", "cancelled")
+
+    def __init__(self, time, order, callback):
+        self.time = time
+        self.order = order
+        self.callback = callback
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.time, self.order) < (other.time, other.order)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Timeline:
+    # Eventos ordenados por tempo simulado. Os eventos já disparados continuam
+    # na lista para que um retrocesso (seek) possa reaplicá-los desde o início.
+    def __init__(self):
+        self.events = []
+        self.cursor = 0
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.events)
+
+    def schedule(self, time, callback):
+        event = TimelineEvent(time, next(self.counter), callback)
+        position = bisect.bisect_right(self.events, event)
+        self.events.insert(position, event)
+        if position < self.cursor:
+            # Evento agendado para um instante que já passou: dispara na hora
+            self.cursor += 1
+            callback()
+        return event
+
+    def clear(self):
+        for event in self.events:
+            event.cancel()
+        self.events = []
+        self.cursor = 0
+
+    def next_time(self):
+        while self.cursor < len(self.events) and self.events[self.cursor].cancelled:
+            self.cursor += 1
+        return self.events[self.cursor].time if self.cursor < len(self.events) else None
+
+    def run_until(self, time):
+        while self.cursor < len(self.events) and self.events[self.cursor].time <= time:
+            event = self.events[self.cursor]
+            self.cursor += 1
+            if not event.cancelled:
+                event.callback()
+
+    def rewind(self):
+        self.cursor = 0
+
+
+class SimulationClock:
+    SPEEDS = {"1×": 1.0, "2×": 2.0, "10×": 10.0, "Máx": float("inf")}
+    CONTINUOUS_MAX_SPEED = 600.0  # "Máx" numa execução sem fim: 10 min simulados por segundo
+
+    def __init__(self):
+        self.time = 0.0
+        self.end_time = 0.0
+        self.speed = 1.0
+        self.paused = False
+        self.timeline = Timeline()
+        self.listeners = []
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def schedule(self, time, callback):
+        return self.timeline.schedule(time, callback)
+
+    def start_run(self, duration):
+        # Cancela tudo que ficou pendente da execução anterior
+        self.timeline.clear()
+        self.time = 0.0
+        self.end_time = duration
+        self.notify()
+
+    def set_speed(self, speed):
+        self.speed = speed
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def advance(self, real_seconds):
+        if self.paused:
+            return
+        speed = self.speed
+        if speed == float("inf") and self.end_time == float("inf"):
+            speed = self.CONTINUOUS_MAX_SPEED
+        elif speed == float("inf"):
+            # Velocidade máxima salta direto para o fim da execução; depois dele
+            # o tempo volta a correr em tempo real
+            if self.time < self.end_time:
+                self.run_until(self.end_time)
+                return
+            speed = 1.0
+        self.run_until(self.time + real_seconds * speed)
+
+    def run_until(self, target):
+        # Os eventos disparam com o relógio já no seu instante, em ordem
+        next_time = self.timeline.next_time()
+        while next_time is not None and next_time <= target:
+            self.time = next_time
+            self.timeline.run_until(next_time)
+            next_time = self.timeline.next_time()
+        self.time = target
+        self.notify()
+
+    def seek(self, target):
+        target = max(0.0, target)
+        if target < self.time:
+            self.timeline.rewind()
+        self.run_until(target)
+
+    def notify(self):
+        for callback in self.listeners:
+            callback(self.time)
@@ -0,0 +1,74 @@
+import argparse
+import sys
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from cache import CACHE
+from drugs import BASELINE_BP, BASELINE_HR, DRUG_NAMES, MODEL_VERSION as CURVES_VERSION, resolve_drug
+from simulation import drug_vertices
+
+GAP = 2.0  # s entre os painéis de duas drogas vizinhas
+
+
+def panel_segments(kind, drugs, duration):
+    # Curvas de todas as drogas num só eixo, cada uma deslocada para o seu painel
+    return [np.column_stack([t + i * (duration + GAP), y])
+            for i, (t, y) in enumerate(drug_vertices(kind, drug, duration) for drug in drugs)]
+
+
+def render_comparison(width, height, drugs=None, duration=10.0, dpi=100):
+    # Uma figura com duas linhas de painéis (PA e FC) de eixo x compartilhado.
+    # Cada linha é uma única LineCollection com as curvas de todas as drogas,
+    # e os separadores são outra, de modo que o desenho custa poucos artistas.
+    drugs = DRUG_NAMES if drugs is None else drugs
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    bp_ax, hr_ax = fig.subplots(2, 1, sharex=True, gridspec_kw=dict(hspace=0.2, left=0.06, right=0.99, top=0.93, bottom=0.12))
+    # Cores alternando entre as duas metades da paleta, para vizinhos bem distintos
+    colors = colormaps["tab20"](np.r_[0:20:2, 1:20:2][:len(drugs)] % 20)
+    step = duration + GAP
+    for ax, kind, baseline, title, unit in ((bp_ax, "bp", BASELINE_BP, "Pressão Arterial", "mmHg"),
+                                            (hr_ax, "hr", BASELINE_HR, "Frequência Cardíaca", "BPM")):
+        ax.add_collection(LineCollection(panel_segments(kind, drugs, duration), colors=colors, linewidths=2))
+        ax.autoscale_view()
+        low, high = ax.get_ylim()
+        ax.vlines(np.arange(1, len(drugs)) * step - GAP / 2, low, high, colors="0.85", linewidths=1)
+        ax.axhline(baseline, color="0.6", lw=0.8, ls="--")
+        ax.set_ylim(low, high)
+        ax.set_title(title, fontsize=14, loc="left")
+        ax.set_ylabel(unit)
+    hr_ax.set_xlim(-GAP / 2, len(drugs) * step - GAP / 2)
+    hr_ax.set_xticks(np.arange(len(drugs)) * step + duration / 2)
+    hr_ax.set_xticklabels([drug.replace(" ", "\n", 1) for drug in drugs], fontsize=9)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def comparison_image(width, height, drugs=None, duration=10.0):
+    # Imagem RGBA (altura, largura, 4) em cache: a mesma tela não é desenhada duas vezes
+    drugs = DRUG_NAMES if drugs is None else [resolve_drug(drug) for drug in drugs]
+    key = ("comparação", width, height, tuple(drugs), duration, CURVES_VERSION)
+    return CACHE.get_or_compute(key, lambda: (render_comparison(width, height, drugs, duration),))[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Imagem com as curvas de PA e FC de todas as drogas lado a lado.")
+    parser.add_argument("drugs", nargs="*", help="Drogas comparadas (nome completo ou início do nome). Padrão: todas.")
+    parser.add_argument("--size", type=int, nargs=2, default=(1600, 600), metavar=("LARGURA", "ALTURA"), help="Tamanho em pixels.")
+    parser.add_argument("-o", "--output", default="comparacao.png", help="Arquivo PNG de saída.")
+    args = parser.parse_args(argv)
+    try:
+        image = comparison_image(*args.size, args.drugs or None)
+    except ValueError as error:
+        parser.error(str(error))
+    from matplotlib.image import imsave
+    imsave(args.output, image)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
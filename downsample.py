@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def buckets(values, count):
+    # Divide em `count` faixas de tamanho igual, repetindo o último valor para completar a matriz
+    size = -(-len(values) // count)
+    return np.pad(values, (0, size * count - len(values)), mode="edge").reshape(count, size)
+
+
+def reveal(x, y, time):
+    # Trecho da curva até `time`: os vértices já passados e o ponto
+    # interpolado no instante atual, qualquer que seja a taxa de quadros
+    n = np.searchsorted(x, time, side='right')
+    if n == 0 or n == len(x) or x[n - 1] == time:
+        return x[:n], y[:n]
+    return np.append(x[:n], time), np.append(y[:n], np.interp(time, x, y))
+
+
+def min_max(x, y, n):
+    # Mínimo e máximo de cada faixa, na ordem em que aparecem: picos e vales
+    # (e a envoltória de um sinal ruidoso) sobrevivem com no máximo n pontos
+    if len(x) <= n or n < 2:
+        return x, y
+    count = n // 2
+    by = buckets(y, count)
+    rows = np.arange(count)
+    first = np.minimum(by.argmin(axis=1), by.argmax(axis=1))
+    second = np.maximum(by.argmin(axis=1), by.argmax(axis=1))
+    offsets = rows * by.shape[1]
+    index = np.minimum(np.column_stack([offsets + first, offsets + second]).ravel(), len(x) - 1)
+    return x[index], y[index]
+
+
+def lttb(x, y, n, passes=2):
+    # Largest-Triangle-Three-Buckets: de cada faixa fica o ponto que forma o
+    # maior triângulo com o ponto escolhido na faixa anterior e a média da
+    # seguinte. A escolha sequencial é trocada por passadas vetorizadas: a
+    # primeira usa a média da faixa anterior e as demais, o ponto escolhido
+    # na passada anterior, o que converge para o mesmo resultado na prática.
+    if len(x) <= n or n < 3:
+        return x, y
+    count = n - 2
+    bx, by = buckets(x[1:-1], count), buckets(y[1:-1], count)
+    rows = np.arange(count)
+    mean_x, mean_y = bx.mean(axis=1), by.mean(axis=1)
+    next_x, next_y = np.append(mean_x[1:], x[-1]), np.append(mean_y[1:], y[-1])
+    prev_x, prev_y = np.insert(mean_x[:-1], 0, x[0]), np.insert(mean_y[:-1], 0, y[0])
+    for _ in range(passes):
+        area = np.abs((prev_x - next_x)[:, None] * (by - prev_y[:, None])
+                      - (prev_x[:, None] - bx) * (next_y - prev_y)[:, None])
+        chosen = area.argmax(axis=1)
+        sel_x, sel_y = bx[rows, chosen], by[rows, chosen]
+        prev_x, prev_y = np.insert(sel_x[:-1], 0, x[0]), np.insert(sel_y[:-1], 0, y[0])
+    return np.concatenate([x[:1], sel_x, x[-1:]]), np.concatenate([y[:1], sel_y, y[-1:]])
+
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+
+BASELINE_BP = 120
+BASELINE_HR = 100
+# Catálogo de drogas: um arquivo JSON por droga, lido em ordem de nome. A
+# ordem do catálogo é a das listas, relatórios e caixas de seleção, e entre
+# drogas marcadas juntas a que vem depois é a exibida.
+DRUGS_DIR = os.environ.get("SIMULADOR_DROGAS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "drogas"))
+PKPD_KEYS = ("ka", "ke", "ke0", "vd", "emax_bp", "emax_hr")
+
+
+class Drug:
+    # Droga do catálogo já validada. Curvas: vértices (tempo em segundos,
+    # valor), lineares entre dois vértices e constantes antes do primeiro e
+    # depois do último; dois vértices no mesmo instante são um salto (o valor
+    # da direita vale a partir dele).
+    def __init__(self, name, order, dose, bp, hr, pkpd, prerequisites, legend):
+        self.name = name
+        self.order = order
+        self.dose = dose  # mg; None se o rótulo não tem dose
+        self.bp = bp
+        self.hr = hr
+        self.pkpd = pkpd
+        self.prerequisites = prerequisites  # marcadas junto com esta na interface
+        self.legend = legend  # texto exibido abaixo dos gráficos (HTML do Qt)
+
+
+def check_vertices(path, key, points):
+    if not isinstance(points, list) or not points:
+        raise ValueError(f"{path}: '{key}' deve ser uma lista de vértices [tempo, valor]")
+    for point in points:
+        if (not isinstance(point, list) or len(point) != 2
+                or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in point)):
+            raise ValueError(f"{path}: vértice inválido em '{key}': {point!r}")
+    if any(b[0] < a[0] for a, b in zip(points, points[1:])):
+        raise ValueError(f"{path}: os tempos de '{key}' devem estar em ordem crescente")
+    return [tuple(point) for point in points]
+
+
+def parse_drug(path, data, order):
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: o arquivo deve conter um objeto JSON")
+    missing = [key for key in ("nome", "pa", "fc", "pkpd", "legenda") if key not in data]
+    if missing:
+        raise ValueError(f"{path}: faltam os campos {', '.join(missing)}")
+    name = data["nome"]
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"{path}: 'nome' deve ser um texto")
+    dose = None
+    if "dose" in data:
+        dose = parse_dose(str(data["dose"]))
+        if dose is None:
+            raise ValueError(f"{path}: dose inválida: {data['dose']!r}")
+    pkpd = data["pkpd"]
+    if not isinstance(pkpd, dict) or set(pkpd) != set(PKPD_KEYS):
+        raise ValueError(f"{path}: 'pkpd' deve ter exatamente os parâmetros {', '.join(PKPD_KEYS)}")
+    if not all(isinstance(pkpd[key], (int, float)) for key in PKPD_KEYS) or min(pkpd[key] for key in PKPD_KEYS[:4]) <= 0:
+        raise ValueError(f"{path}: ka, ke, ke0 e vd devem ser positivos e emax_bp e emax_hr, números")
+    prerequisites = data.get("prerrequisitos", [])
+    if not isinstance(prerequisites, list) or not all(isinstance(item, str) for item in prerequisites):
+        raise ValueError(f"{path}: 'prerrequisitos' deve ser uma lista de nomes de drogas")
+    legend = data["legenda"]
+    # Legendas longas podem ser escritas como uma lista de trechos
+    legend = "".join(legend) if isinstance(legend, list) else legend
+    if not isinstance(legend, str):
+        raise ValueError(f"{path}: 'legenda' deve ser um texto ou uma lista de textos")
+    return Drug(name, order, dose, check_vertices(path, "pa", data["pa"]), check_vertices(path, "fc", data["fc"]),
+                {key: float(pkpd[key]) for key in PKPD_KEYS}, prerequisites, legend)
+
+
+def load_catalog(directory):
+    # Lê e valida o catálogo uma vez. Devolve as drogas por nome, na ordem do
+    # catálogo, e um resumo (SHA-256) do conteúdo dos arquivos, que entra na
+    # versão dos modelos: editar um arquivo invalida o que estava em cache.
+    try:
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json"))
+    except OSError as error:
+        raise ValueError(f"Catálogo de drogas não encontrado: {error}") from error
+    digest = hashlib.sha256()
+    drugs = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        digest.update(content)
+        try:
+            data = json.loads(content.decode("utf-8"))
+        except ValueError as error:
+            raise ValueError(f"{path}: JSON inválido: {error}") from error
+        drug = parse_drug(path, data, len(drugs))
+        if drug.name in drugs:
+            raise ValueError(f"{path}: droga repetida no catálogo: {drug.name!r}")
+        drugs[drug.name] = drug
+    if not drugs:
+        raise ValueError(f"Catálogo de drogas vazio: {directory}")
+    for drug in drugs.values():
+        unknown = [name for name in drug.prerequisites if name not in drugs or name == drug.name]
+        if unknown:
+            raise ValueError(f"{drug.name}: pré-requisitos inválidos: {', '.join(unknown)}")
+    return drugs, digest.hexdigest()
+
+
+DOSE_UNITS = {"mg": 1.0, "mcg": 1e-3, "µg": 1e-3, "ug": 1e-3, "g": 1e3}
+DOSE_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*(mcg|µg|ug|mg|g)\b", re.IGNORECASE)
+
+
+def parse_dose(text):
+    # Dose em mg a partir de textos como "20mcg", "1,5mg" ou "2 mg"
+    match = DOSE_PATTERN.search(text)
+    if match is None:
+        return None
+    return float(match.group(1).replace(",", ".")) * DOSE_UNITS[match.group(2).lower()]
+
+
+DRUGS, CATALOG_DIGEST = load_catalog(DRUGS_DIR)
+# A parte fixa muda com o código que amostra as curvas; o resumo, a cada edição do catálogo
+MODEL_VERSION = f"3:{CATALOG_DIGEST[:16]}"
+DRUG_NAMES = list(DRUGS)
+BP_BREAKPOINTS = {name: drug.bp for name, drug in DRUGS.items()}
+HR_BREAKPOINTS = {name: drug.hr for name, drug in DRUGS.items()}
+LEGENDS = {name: drug.legend for name, drug in DRUGS.items()}
+
+
+def resolve_drug(name):
+    # Aceita o nome completo ou só o início dele ("nora" -> "Noradrenalina 20mcg")
+    if name in DRUGS:
+        return name
+    matches = [drug for drug in DRUG_NAMES if drug.lower().startswith(name.lower())]
+    if len(matches) != 1:
+        raise ValueError(f"Droga desconhecida ou ambígua: {name!r}")
+    return matches[0]
+
+
+class CurveBank:
+    """Tabelas de vértices compiladas para avaliar todas as curvas de uma vez."""
+
+    def __init__(self, breakpoints, default):
+        self.names = list(breakpoints)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.default = default
+
+        # Todas as tabelas são completadas até o mesmo número de vértices
+        # repetindo o último, o que não altera a curva.
+        size = max(len(points) for points in breakpoints.values()) + 1
+        self.xp = np.empty((len(self.names), size))
+        self.fp = np.empty((len(self.names), size))
+        for i, name in enumerate(self.names):
+            points = np.asarray(breakpoints[name], dtype=float)
+            self.xp[i, :len(points)] = points[:, 0]
+            self.fp[i, :len(points)] = points[:, 1]
+            self.xp[i, len(points):] = points[-1, 0]
+            self.fp[i, len(points):] = points[-1, 1]
+
+        # Deslocando cada linha para um intervalo próprio, uma única busca
+        # binária no vetor achatado localiza o segmento de todas as drogas.
+        self.lo = self.xp.min()
+        self.span = self.xp.max() - self.lo + 1.0
+        self.offsets = np.arange(len(self.names)) * self.span
+        self.flat_xp = (self.xp - self.lo + self.offsets[:, None]).ravel()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def end_time(self, name):
+        # Instante do último vértice: daí em diante a curva é constante
+        return self.xp[self.index[name], -1]
+
+    def final_value(self, name):
+        return self.fp[self.index[name], -1]
+
+    def evaluate(self, x, names=None):
+        rows = np.arange(len(self.names)) if names is None else np.array([self.index[n] for n in names], dtype=int)
+        x = np.asarray(x, dtype=float)
+        size = self.xp.shape[1]
+
+        xc = np.clip(x, self.lo, self.lo + self.span - 1.0) - self.lo
+        position = np.searchsorted(self.flat_xp, xc + self.offsets[rows][:, None], side='right')
+        segment = np.clip(position - rows[:, None] * size - 1, 0, size - 2)
+
+        x0 = self.xp[rows[:, None], segment]
+        x1 = self.xp[rows[:, None], segment + 1]
+        y0 = self.fp[rows[:, None], segment]
+        y1 = self.fp[rows[:, None], segment + 1]
+        width = x1 - x0
+        t = np.divide(np.clip(x, x0, x1) - x0, width, out=np.ones_like(width), where=width > 0)
+        return y0 + t * (y1 - y0)
+
+    def vertices(self, name, start, end):
+        # Curva exata em [start, end]: os vértices da tabela dentro do intervalo
+        # e os valores nas duas pontas. Picos e saltos ficam onde a tabela diz,
+        # com poucos pontos, em vez de caírem (ou não) numa grade uniforme.
+        if name not in self.index:
+            return np.array([start, end], dtype=float), np.full(2, float(self.default))
+        row = self.index[name]
+        xp, fp = self.xp[row], self.fp[row]
+        # O completamento repete o último vértice; saltos (mesmo x, outro valor) ficam
+        distinct = np.concatenate([[True], (np.diff(xp) != 0) | (np.diff(fp) != 0)])
+        inside = distinct & (xp > start) & (xp < end)
+        ends = self.evaluate([start, end], [name])[0]
+        return np.concatenate([[start], xp[inside], [end]]), np.concatenate([ends[:1], fp[inside], ends[1:]])
+
+    def evaluate_one(self, name, x):
+        if name not in self.index:
+            return np.full_like(np.asarray(x, dtype=float), self.default)
+        return self.evaluate(x, [name])[0]
+
+
+BP_CURVES = CurveBank(BP_BREAKPOINTS, BASELINE_BP)
+HR_CURVES = CurveBank(HR_BREAKPOINTS, BASELINE_HR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida um catálogo de drogas e lista o que ele contém.")
+    parser.add_argument("directory", nargs="?", default=DRUGS_DIR, help="Pasta com um arquivo JSON por droga.")
+    args = parser.parse_args(argv)
+    try:
+        drugs, digest = load_catalog(args.directory)
+    except ValueError as error:
+        parser.error(str(error))
+    for drug in drugs.values():
+        dose = "—" if drug.dose is None else f"{drug.dose:g} mg"
+        prerequisites = f"  (com {', '.join(drug.prerequisites)})" if drug.prerequisites else ""
+        print(f"{drug.name:<24} {dose:>9}  PA {len(drug.bp)} vértices, FC {len(drug.hr)}{prerequisites}")
+    print(f"{len(drugs)} drogas, resumo {digest[:16]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import numpy as np
+
+from downsample import min_max, reveal
+from instrumentation import profiled
+from simulation import drug_vertices
+
+
+class CurveGraph:
+    # Estado das curvas e avanço no tempo comuns aos dois backends de
+    # gráficos (matplotlib em graphs.py, QPainter em tracewidget.py). Cada
+    # backend só desenha, através de set_line, set_band_trace, clear_band,
+    # set_axes, get_ylim, redraw e draw_frame.
+    reveal = staticmethod(reveal)
+
+    def init_curve(self):
+        self.live = False
+        self.band_values = None
+        self.current_time = None
+        self.x = np.linspace(0, 10, 100)
+
+    def set_band(self, band):
+        # band: (inferior, superior) com o mesmo tamanho da curva, ou None
+        self.band_values = band
+        self.clear_band()
+
+    def update_band(self, x, time):
+        if self.band_values is None:
+            return
+        low, high = self.band_values
+        t, low = self.reveal(x, low, time)
+        t, high = self.reveal(x, high, time)
+        self.set_band_trace(t, low, high)
+
+    def fit_limits(self, x, y, margin=0.1):
+        if self.band_values is not None:
+            y = np.concatenate([np.ravel(y), *self.band_values])
+        low, high = np.min(y), np.max(y)
+        pad = max((high - low) * margin, 5)
+        self.set_axes((x[0], x[-1]), (low - pad, high + pad))
+        self.set_line([], [])
+        self.redraw()
+
+    def start_live(self, window):
+        # Janela deslizante com o tempo relativo à amostra mais recente: os
+        # eixos ficam fixos e o fundo guardado continua valendo entre quadros
+        self.live = True
+        self.set_band(None)
+        self.set_axes(xlim=(-window, 0))
+        self.set_line([], [])
+        self.redraw()
+
+    def show_live(self, t, y, margin=0.1, downsample=min_max):
+        if len(t) == 0:
+            return
+        # No máximo dois pontos por pixel de largura: o custo do quadro não
+        # depende de quantas amostras a janela visível contém
+        t, y = downsample(t, y, 2 * max(self.width(), 100))
+        self.set_line(t - t[-1], y)
+        low, high = self.get_ylim()
+        if y.min() < low or y.max() > high:
+            # Só uma saída da faixa atual redesenha eixos e fundo
+            pad = max((y.max() - y.min()) * margin, 5)
+            self.set_axes(ylim=(min(low, y.min() - pad), max(high, y.max() + pad)))
+            self.redraw()
+        self.draw_frame()
+
+
+class HeartRateCurve(CurveGraph):
+    def init_curve(self):
+        super().init_curve()
+        self.y = np.full_like(self.x, 70)
+        self.x_values = self.x
+        self.y_values = None
+
+    def start_animation(self, new_values, x=None, band=None):
+        # Sem x, a curva usa a grade padrão de 10 s
+        self.x_values = self.x if x is None else x
+        self.y_values = new_values
+        self.live = False
+        self.set_band(band)
+        self.current_time = None
+        self.fit_limits(self.x_values, self.y_values)
+
+    def show_time(self, time):
+        if self.y_values is None or self.live:
+            return
+        # Depois do último vértice a curva não muda mais
+        time = min(time, self.x_values[-1])
+        if time != self.current_time:
+            self.current_time = time
+            self.update_animation()
+
+    @profiled("HeartRateCurve.update_animation")
+    def update_animation(self):
+        self.set_line(*self.reveal(self.x_values, self.y_values, self.current_time))
+        self.update_band(self.x_values, self.current_time)
+        self.draw_frame()
+
+
+class BloodPressureCurve(CurveGraph):
+    def init_curve(self):
+        super().init_curve()
+        self.y = None
+
+    def apply_drug(self, drug_name):
+        self.drug_name = drug_name
+        self.x, self.y = drug_vertices("bp", drug_name)
+        self.set_band(None)
+
+    def set_curve(self, x, y, band=None):
+        self.x = x
+        self.y = y
+        self.set_band(band)
+
+    def update_blood_pressure(self, new_values):
+        self.current_time = None
+        self.live = False
+        self.fit_limits(self.x, self.y)
+
+    def show_time(self, time):
+        if self.y is None or self.live:
+            return
+        time = min(time, self.x[-1])
+        if time != self.current_time:
+            self.current_time = time
+            self.draw_graph(time)
+
+    @profiled("BloodPressureCurve.draw_graph")
+    def draw_graph(self, time):
+        self.update_graph(time)
+        self.draw_frame()
+
+    def update_graph(self, time):
+        # A onda de pulso tem milhares de amostras: no máximo dois pontos por pixel
+        self.set_line(*min_max(*self.reveal(self.x, self.y, time), 2 * max(self.width(), 100)))
+        self.update_band(self.x, time)
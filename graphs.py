@@ -0,0 +1,96 @@
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+
+from graphcurves import BloodPressureCurve, HeartRateCurve
+
+
+class BlitGraph(FigureCanvas):
+    # Guarda o fundo estático (eixos, títulos, marcações) a cada desenho completo
+    # e, nos quadros da animação, redesenha apenas a linha (e a faixa de
+    # percentis, no modo população) sobre ele. As curvas e o avanço no tempo
+    # ficam em graphcurves.py, comuns aos traços QPainter.
+    def __init__(self):
+        # Figure direto, sem pyplot: nada é registrado no gerenciador global de figuras
+        self.fig = Figure(figsize=(3, 3))
+        self.ax = self.fig.add_subplot()
+        super().__init__(self.fig)
+        self.background = None
+        self.band = PolyCollection([], alpha=0.3, animated=True)
+        self.ax.add_collection(self.band)
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def animated_artists(self):
+        return [self.band, self.line]
+
+    def on_draw(self, event):
+        # Ignora desenhos feitos por outros backends (ex.: ao salvar em PDF)
+        if event.canvas is not self:
+            return
+        self.background = self.copy_from_bbox(self.ax.bbox)
+        for artist in self.animated_artists():
+            self.ax.draw_artist(artist)
+
+    def set_line(self, x, y):
+        self.line.set_data(x, y)
+
+    def clear_band(self):
+        self.band.set_facecolor(self.line.get_color())
+        self.band.set_verts([])
+
+    def set_band_trace(self, t, low, high):
+        if len(t) < 2:
+            return
+        self.band.set_verts([np.column_stack([np.concatenate([t, t[::-1]]),
+                                              np.concatenate([high, low[::-1]])])])
+
+    def set_axes(self, xlim=None, ylim=None):
+        if xlim is not None:
+            self.ax.set_xlim(*xlim)
+        if ylim is not None:
+            self.ax.set_ylim(*ylim)
+
+    def get_ylim(self):
+        return self.ax.get_ylim()
+
+    def redraw(self):
+        # Desenho completo: eixos e fundo, guardado de novo em on_draw
+        self.draw()
+
+    def draw_frame(self):
+        if self.background is None:
+            self.draw()
+            return
+        self.restore_region(self.background)
+        for artist in self.animated_artists():
+            self.ax.draw_artist(artist)
+        self.blit(self.ax.bbox)
+
+
+class HeartRateGraph(HeartRateCurve, BlitGraph):
+    def __init__(self, parent=None):
+        super().__init__()
+
+        self.ax.set_ylim(60, 200)
+        self.ax.set_xlim(0, 10)
+        self.ax.set_xlabel('')
+        self.ax.set_ylabel('BPM', fontsize=20)
+        self.ax.set_title('Variação da Frequência Cardíaca', fontsize=20)
+        self.ax.tick_params(axis='both', labelsize=20)
+        self.line, = self.ax.plot([], [], lw=2, animated=True)
+        self.init_curve()
+
+
+class BloodPressureGraph(BloodPressureCurve, BlitGraph):
+    def __init__(self, parent=None):
+        super().__init__()
+
+        self.ax.set_ylim(0, 200)
+        self.ax.set_xlim(0, 10)
+        self.ax.set_xlabel('Tempo')
+        self.ax.set_ylabel('mmHg', fontsize=22)
+        self.ax.set_title('Efeito da Droga na Pressão Arterial', fontsize=20)
+        self.ax.tick_params(axis='both', labelsize=20)
+        self.line, = self.ax.plot([], [], lw=2, animated=True)
+        self.init_curve()
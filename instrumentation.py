@@ -0,0 +1,100 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+FRAME_BUDGET = 0.1  # s; acima disso o quadro é perceptivelmente atrasado no projetor
+
+
+class FrameProfiler:
+    # Registra a duração de cada callback do laço de animação e o atraso de
+    # cada disparo do timer. Os registros ficam em filas de tamanho fixo, de
+    # modo que o perfilador pode ficar ligado durante uma aula inteira.
+    def __init__(self, capacity=20000):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.spans = deque(maxlen=capacity)  # (nome, início, duração)
+        self.ticks = deque(maxlen=capacity)  # (instante, atraso, quadros perdidos)
+        self.last_tick = None
+
+    def clear(self):
+        self.spans.clear()
+        self.ticks.clear()
+        self.last_tick = None
+
+    def record(self, name, start, duration):
+        self.spans.append((name, start - self.origin, duration))
+
+    def timer_fired(self, interval):
+        # Atraso em relação ao disparo esperado; cada intervalo inteiro a mais
+        # conta como um quadro perdido
+        now = time.perf_counter()
+        if self.last_tick is not None:
+            lateness = max(0.0, now - self.last_tick - interval)
+            self.ticks.append((now - self.origin, lateness, int(lateness // interval)))
+        self.last_tick = now
+
+    def summary(self, window=5.0):
+        # Estatísticas dos últimos `window` segundos
+        since = time.perf_counter() - self.origin - window
+        callbacks = {}
+        for name, start, duration in self.spans:
+            if start >= since:
+                callbacks.setdefault(name, []).append(duration)
+        ticks = [tick for tick in self.ticks if tick[0] >= since]
+        return dict(
+            callbacks={name: dict(count=len(durations), mean=sum(durations) / len(durations), max=max(durations),
+                                  over_budget=sum(duration > FRAME_BUDGET for duration in durations))
+                       for name, durations in callbacks.items()},
+            fps=(len(ticks) - 1) / (ticks[-1][0] - ticks[0][0]) if len(ticks) > 1 else 0.0,
+            lateness_mean=sum(lateness for _, lateness, _ in ticks) / len(ticks) if ticks else 0.0,
+            lateness_max=max((lateness for _, lateness, _ in ticks), default=0.0),
+            dropped=sum(dropped for _, _, dropped in ticks),
+        )
+
+    def format_summary(self, window=5.0):
+        stats = self.summary(window)
+        lines = [f"{stats['fps']:5.1f} quadros/s   atraso médio {stats['lateness_mean'] * 1000:5.1f} ms"
+                 f"   máx {stats['lateness_max'] * 1000:5.1f} ms   perdidos {stats['dropped']}"]
+        for name, callback in sorted(stats["callbacks"].items()):
+            lines.append(f"{name:<36} {callback['mean'] * 1000:6.2f} ms  máx {callback['max'] * 1000:7.2f} ms"
+                         f"  >{FRAME_BUDGET * 1000:.0f} ms: {callback['over_budget']}")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        # Formato Trace Event (chrome://tracing, Perfetto): durações como
+        # eventos completos e o atraso do timer como contador
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [dict(name=name, cat="callback", ph="X", ts=start * 1e6, dur=duration * 1e6, pid=pid, tid=tid)
+                  for name, start, duration in self.spans]
+        for instant, lateness, dropped in self.ticks:
+            events.append(dict(name="atraso do timer (ms)", ph="C", ts=instant * 1e6, pid=pid, args=dict(atraso=lateness * 1000)))
+            if dropped:
+                events.append(dict(name="quadros perdidos", cat="timer", ph="i", s="p", ts=instant * 1e6, pid=pid, tid=tid,
+                                   args=dict(perdidos=dropped)))
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+PROFILER = FrameProfiler()
+
+
+def profiled(name):
+    # Mede cada chamada da função enquanto o perfilador estiver ligado
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.record(name, start, time.perf_counter() - start)
+        return wrapper
+    return decorate
@@ -1,406 +1,205 @@
+from startup import STARTUP
+import json
+import os
 import sys
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QCheckBox, QFileDialog)
-from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QPixmap, QPalette, QColor
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import time
+
 import numpy as np
-from matplotlib.animation import FuncAnimation
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QCheckBox, QFileDialog, QSlider, QButtonGroup, QSpinBox, QShortcut, QProgressBar, QComboBox, QTableWidget, QTableWidgetItem, QHeaderView, QStackedWidget, QSizePolicy)
+from PyQt5.QtCore import QTimer, Qt, QEvent, QThread, pyqtSignal
+from PyQt5.QtGui import QPixmap, QImage, QPalette, QColor, QKeySequence
+from cache import CACHE
+from drugs import BASELINE_BP, BASELINE_HR, DRUGS, DRUG_NAMES, LEGENDS, MODEL_VERSION as CURVES_VERSION
+from protocol import ProtocolEvent, ProtocolScheduler, load_protocol, run_protocol
+from pkpd import PKPDModel, MODEL_VERSION as PKPD_VERSION
+from population import run_population
+from simulation import drug_vertices
+from clock import SimulationClock
+from instrumentation import PROFILER, profiled
+from sources import RingBuffer, open_source
+from downsample import lttb, min_max
+from metrics import METRICS, format_value, scenario_metrics
+from recording import SUFFIX as SESSION_SUFFIX, Session, SessionRecorder
+from waveform import PulseSynthesizer, synthesize
+
+# O matplotlib só é importado com os gráficos (graphs.py), depois da primeira pintura da janela
+STARTUP.mark("importação")
+
+
+# Quadros do ciclo cardíaco, exibidos em sequência
+CARDIAC_CYCLE = ["assets/Sístole.jpg", "assets/Diástole.jpg"]
+RUN_DURATION = 10  # segundos simulados de cada aplicação
+TICK_INTERVAL = 50  # ms entre avanços do relógio simulado
+LIVE_WINDOW = 10.0  # segundos visíveis no modo ao vivo
+LIVE_FRAME_INTERVAL = 33  # ms; redesenho ao vivo limitado a ~30 quadros/s, qualquer que seja a taxa de entrada
+LIVE_CAPACITY = 2 ** 16  # amostras guardadas (~65 s a 1 kHz)
+CONTINUOUS_RESOLUTION = 0.1  # s entre amostras do modo contínuo
+CONTINUOUS_CAPACITY = int(4 * 3600 / CONTINUOUS_RESOLUTION)  # histórico de 4 h, alocado uma vez
+CONTINUOUS_WINDOWS = {"10 s": 10.0, "1 min": 60.0, "10 min": 600.0, "1 h": 3600.0, "4 h": 14400.0}
+WAVEFORM_RATE = 500  # Hz da onda de pulso nas aplicações e protocolos
+CONTINUOUS_WAVEFORM_RATE = 250  # Hz no modo contínuo
+WAVEFORM_CAPACITY = 3600 * CONTINUOUS_WAVEFORM_RATE  # última 1 h de onda, alocada uma vez
+# Cada sessão é gravada ao fechar o simulador; SIMULADOR_SESSOES_DIR vazio desliga a gravação
+SESSIONS_DIR = os.environ.get("SIMULADOR_SESSOES_DIR", "sessoes")
+# SIMULADOR_GRAFICOS=qt troca os gráficos do matplotlib pelos traços desenhados com QPainter
+GRAPH_BACKEND = os.environ.get("SIMULADOR_GRAFICOS", "matplotlib")
 
 
 class HeartbeatAnimation(QLabel):
-    def __init__(self):
+    rate_changed = pyqtSignal(float)
+
+    def __init__(self, frame_paths=CARDIAC_CYCLE):
         super().__init__()
-        self.systole_image = QPixmap("assets/Sístole.jpg")
-        self.diastole_image = QPixmap("assets/Diástole.jpg")
-        self.current_image = self.systole_image
+        self.frames = [QPixmap(path) for path in frame_paths]
+        self.frame_cache = []
+        self.frame_cache_size = None
+        self.current_index = 0
         self.setFixedSize(400, 400)
-        self.setScaledContents(True)
-        self.setPixmap(self.current_image.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_image)
-        self.timer.start(700)  # Intervalo inicial padrão de 500ms
-
-    def update_image(self):
-        if self.current_image == self.systole_image:
-            self.current_image = self.diastole_image
-        else:
-            self.current_image = self.systole_image
-        self.setPixmap(self.current_image.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-
-    def set_speed(self, interval):
-        self.timer.setInterval(interval)
-
-class HeartRateGraph(FigureCanvas):
-    def __init__(self, parent=None):
-        self.fig, self.ax = plt.subplots(figsize=(3, 3))
-        super().__init__(self.fig)
-        
-        self.ax.set_ylim(60, 200)
-        self.ax.set_xlim(0, 10)
-        self.ax.set_xlabel('')
-        self.ax.set_ylabel('BPM', fontsize=20)
-        self.ax.set_title('Variação da Frequência Cardíaca', fontsize=20)
-        self.ax.tick_params(axis='both', labelsize=20)
-        self.line, = self.ax.plot([], [], lw=2)
-        self.x = np.linspace(0, 10, 100)
-        self.y = np.full_like(self.x, 70)
-
-        self.current_frame = 0
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_animation)
-
-    def start_animation(self, new_values):
-        self.y_values = new_values
-        self.current_frame = 0
-        self.timer.start(100)
-    
-    def update_animation(self):
-        if self.current_frame < len(self.x):
-            self.line.set_data(self.x[:self.current_frame], self.y_values[:self.current_frame])
-            self.ax.relim()
-            self.ax.autoscale_view()
-            self.draw()
-            self.current_frame += 1
-        else:
-            self.timer.stop()
-
-class BloodPressureGraph(FigureCanvas):
-    def __init__(self, parent=None):
-        self.fig, self.ax = plt.subplots(figsize=(3, 3))
-        super().__init__(self.fig)
-
-        self.ax.set_ylim(0, 200)
-        self.ax.set_xlim(0, 10)
-        self.ax.set_xlabel('Tempo')
-        self.ax.set_ylabel('mmHg', fontsize=22)
-        self.ax.set_title('Efeito da Droga na Pressão Arterial', fontsize=20)
-        self.ax.tick_params(axis='both', labelsize=20)
-        self.line, = self.ax.plot([], [], lw=2)
-        self.anim = None
-
-
-    def apply_drug(self, drug_name):
-        self.x = np.linspace(0, 10, 100)
-        
-        if drug_name == "Noradrenalina 20mcg":
-            self.y = self.effect_noradrenalina(self.x)
-        elif drug_name == "Adrenalina 20mcg":
-            self.y = self.effect_adrenalina(self.x)
-        elif drug_name == "Isoprenalina 20mcg":
-            self.y = self.effect_isoprenalina(self.x)
-        elif drug_name == "Efedrina 5mg":
-            self.y = self.effect_efedrina(self.x)
-        elif drug_name == "Acetilcolina 20mcg":
-            self.y = self.effect_acetilcolina(self.x)
-        elif drug_name == "Pilocarpina 1,5mg":
-            self.y = self.effect_pilocarpina(self.x)
-        elif drug_name == "Alfabloqueador":
-            self.y = self.effect_alfabloqueador(self.x)
-        elif drug_name == "Neostigmina 0,5mg":
-            self.y = self.effect_neostigmina(self.x)
-        elif drug_name == "Nicotina 300mg":
-            self.y = self.effect_nicotina(self.x)
-        elif drug_name == "Propanolol 10mg":
-            self.y = self.effect_propanolol(self.x)
-        elif drug_name == "Atropina 10mg":
-            self.y = self.effect_atropina(self.x)
-        elif drug_name == "Hexametonio 20mg":
-            self.y = self.effect_hexametonio(self.x)
-        else:
-            self.y = np.full_like(self.x, 120)
-
-        
-    def update_blood_pressure(self, new_values):
-        self.line.set_data([], [])
-        self.ax.relim()
-        self.ax.autoscale_view()
-        self.anim = FuncAnimation(self.fig, self.update_graph, frames=len(self.x), interval=100, blit=False, repeat=False)
-        self.anim._stop = self.on_animation_complete
-        self.draw()
-
-    def update_graph(self, i):
-        self.line.set_data(self.x[:i], self.y[:i])
-        return self.line,
-
-    def on_animation_complete(self):
-        self.save_graph()
-
-    def save_graph(self):
-        options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getSaveFileName(self, "Salvar Gráfico", "", "PDF Files (*.pdf);;All Files (*)", options=options)
-        if file_path:
-            # Obtém o nome da droga administrada
-            if self.parent() and hasattr(self.parent(), 'current_drug'):
-                drug_name = self.parent().current_drug
-            else:
-                drug_name = "Droga não especificada"
-
-            original_title = self.ax.get_title()
-            self.ax.set_title(f"Efeito da Droga: {drug_name}")
-
-            self.line.set_data(self.x, self.y)
-            self.ax.relim()
-            self.ax.autoscale_view()
-            self.draw()
-            self.fig.savefig(file_path, format="pdf", bbox_inches="tight")
-
-            # Restaura o título original após salvar
-            self.ax.set_title(original_title)
-
-           
-
-
-    def effect_noradrenalina(self, x):
-        y_initial = 120
-        slope_up = 15
-        slope_down = -15
-        y = np.piecewise(x, 
-                         [x < 3, (x >= 3) & (x < 5), (x >= 5) & (x < 7), x >= 7], 
-                         [y_initial, 
-                          lambda x: slope_up * (x - 3) + y_initial,  
-                          lambda x: slope_down * (x - 5) + (slope_up * 2) + y_initial,  
-                          y_initial])  
-        return y
-
-    def effect_adrenalina(self, x):
-        y_initial = 120
-        max_pressure = 150
-        min_pressure = 110
-        slope_up = (max_pressure - y_initial) / 2
-        slope_down = (min_pressure - max_pressure) / 2
-        slope_up_final = (y_initial - min_pressure) / 2
-
-        y = np.piecewise(
-            x,
-            [x < 3, (x >= 3) & (x < 5), (x >= 5) & (x < 7), (x >= 7) & (x < 9), x >= 9],
-            [
-                y_initial, 
-                lambda x: slope_up * (x - 3) + y_initial, 
-                lambda x: slope_down * (x - 5) + max_pressure,
-                lambda x: slope_up_final * (x - 7) + min_pressure, 
-                y_initial 
-            ]
-        )
-        return y
-    
-    def effect_isoprenalina(self, x):
-        y_initial = 120
-        min_pressure = 60 
-        slope_down = (min_pressure - y_initial) / 0.5 
-        slope_up = (y_initial - min_pressure) / 0.5 
-
-        y = np.piecewise(
-            x,
-            [
-                x < 3,
-                (x >= 3) & (x < 3.5), 
-                (x >= 3.5) & (x < 4), 
-                x >= 4, 
-            ],
-            [
-                y_initial, 
-                lambda x: slope_down * (x - 3) + y_initial, 
-                lambda x: slope_up * (x - 3.5) + min_pressure, 
-                y_initial, 
-            ]
-        )
-        return y
-
-    
-    def effect_efedrina(self, x):
-        y_initial = 120 
-        max_pressure = 140 
-        slope_up = (max_pressure - y_initial) / 2  
-        slope_down = (y_initial - max_pressure) / 2  
-
-        y = np.piecewise(
-            x,
-            [x < 3, (x >= 3) & (x < 5), (x >= 5) & (x < 8), (x >= 8) & (x < 10), x >= 10],
-            [
-                y_initial,  
-                lambda x: slope_up * (x - 3) + y_initial,  
-                max_pressure, 
-                lambda x: slope_down * (x - 8) + max_pressure,  
-                y_initial  
-            ]
-        )
-        return y
-    
-    def effect_acetilcolina(self, x):
-        y_initial = 120
-        min_pressure = 90  
-        slope_down = (min_pressure - y_initial) 
-        slope_up = (y_initial - min_pressure)  
-
-        y = np.piecewise(
-            x,
-            [x < 2, (x >= 2) & (x < 3), (x >= 3) & (x < 4), x >= 4],
-            [
-                y_initial,  
-                lambda x: slope_down * (x - 2) + y_initial,  
-                lambda x: slope_up * (x - 3) + min_pressure,  
-                y_initial  
-            ]
-        )
-        return y
-    
-    def effect_pilocarpina(self, x):
-        y_initial = 120
-        min_pressure = 80  
-        slope_down = (min_pressure - y_initial) / 0.5 
-        slope_up = (y_initial - min_pressure) / 2  
-
-        y = np.piecewise(
-            x,
-            [x < 2, (x >= 2) & (x < 2.5), (x >= 2.5) & (x < 3.5), (x >= 3.5) & (x < 5.5), x >= 5.5],
-            [
-                y_initial, 
-                lambda x: slope_down * (x - 2) + y_initial,  
-                min_pressure,  
-                lambda x: slope_up * (x - 3.5) + min_pressure,  
-                y_initial  
-            ]
-        )
-        return y
-    
-    def effect_alfabloqueador(self, x):
-        y_initial = 120
-        y_stabilize_low = 100 
-        max_pressure = 130  
-        min_pressure = 80 
-        y = np.piecewise(
-            x,
-            [ x < 2, (x >= 2) & (x < 3), (x >= 3) & (x < 4), (x >= 4) & (x < 4.5), (x >= 4.5) & (x < 5), (x >= 5) & (x < 6), x >= 6,],
-            [
-                y_initial,  
-                lambda x: (y_stabilize_low - y_initial) * (x - 2) / 1 + y_initial,  
-                y_stabilize_low,  
-                lambda x: (max_pressure - y_stabilize_low) * (x - 4) / 0.5 + y_stabilize_low, 
-                max_pressure, 
-                lambda x: (min_pressure - max_pressure) * (x - 5) / 1 + max_pressure,  
-                y_initial, 
-            ]
-        )
-        return y
-    
-    def effect_neostigmina(self, x):
-        y_initial = 120  
-        y_mid = 110  
-        y_low = 60  
-        y = np.piecewise(
-            x,
-            [  x < 1, (x >= 1) & (x < 1.4), (x >= 1.4) & (x < 2.4), (x >= 2.4) & (x < 3.4), (x >= 3.4) & (x < 3.8), (x >= 3.8) & (x < 5.8), x >= 5.8,],
-            [
-                y_initial,  
-                lambda x: (y_mid - y_initial) * (x - 1) / 0.4 + y_initial, 
-                y_mid,  
-                lambda x: (y_low - y_mid) * (x - 2.4) / 1 + y_mid, 
-                y_low,  
-                lambda x: (y_initial - y_low) * (x - 3.8) / 2 + y_low,  
-                y_initial, 
-            ]
-        )
-        return y
-    
-    def effect_nicotina(self, x):
-        y_initial = 120
-        y_mid1 = 110
-        y_high = 140
-        y_mid2 = 130
-
-        y = np.piecewise(
-            x,
-            [ x < 1, (x >= 1) & (x < 1.8), (x >= 1.8) & (x < 2.6), (x >= 2.6) & (x < 3.4), (x >= 3.4) & (x < 4.2), (x >= 4.2) & (x < 5), 
-             (x >= 5) & (x < 5.8), (x >= 5.8) & (x < 6.6),  x >= 6.6, ],
-            [
-                y_initial,
-                lambda x: (y_mid1 - y_initial) * (x - 1) / 0.8 + y_initial,
-                y_mid1,
-                lambda x: (y_high - y_mid1) * (x - 2.6) / 0.8 + y_mid1,
-                lambda x: (y_mid2 - y_high) * (x - 3.4) / 0.8 + y_high,
-                y_mid2,  
-                lambda x: (y_high - y_mid2) * (x - 5) / 0.8 + y_mid2,  
-                lambda x: (y_initial - y_high) * (x - 5.8) / 0.8 + y_high,  
-                y_initial, 
-            ]
-        )
-        return y
-    
-    def effect_propanolol(self, x):
-        y_initial = 120
-        y_high = 140
-
-        y = np.piecewise(
-            x,
-            [
-                x < 3,  
-                (x >= 3) & (x < 4),  
-                (x >= 4) & (x < 5),
-                (x >= 5) & (x < 6),  
-                (x >= 6) & (x < 7),  
-                (x >= 7) & (x < 8),  
-                x >= 8,  
-            ],
-            [
-                y_initial,  
-                lambda x: (y_high - y_initial) * (x - 3) / 1 + y_initial, 
-                lambda x: (y_initial - y_high) * (x - 4) /1 + y_high,
-                y_initial, 
-                lambda x: (y_high - y_initial) * (x - 6) /1 + y_initial,
-                lambda x: (y_initial - y_high) * (x - 7) / 1 + y_high,  
-                y_initial, 
-            ]
-        )
-        return y
-    
-    def effect_atropina(self, x):
-        y_initial = 120
-        y_high = 150
-        y_mid = 140
-
-        y = np.piecewise(
-            x,
-            [
-                x < 3,  
-                (x >= 3) & (x < 4),  
-                (x >= 4) & (x < 4.5), 
-                (x >= 4.5) & (x < 5), 
-                (x >= 5) & (x < 6),  
-                x >= 6,  
-            ],
-            [
-                y_initial,  
-                lambda x: (y_high - y_initial) * (x - 3) / 1 + y_initial,  
-                lambda x: (y_mid - y_high) * (x - 4) / 0.5 + y_high,  
-                lambda x: (y_high - y_mid) * (x - 4.5) / 0.5 + y_mid,  
-                lambda x: (y_initial - y_high) * (x - 5) / 1 + y_high,  
-                y_initial,  
-            ]
-        )
-        return y
-    
-    def effect_hexametonio(self, x):
-        y_initial = 120
-        y_low = 110
-
-        y = np.piecewise(
-            x,
-            [
-                x < 3,  
-                (x >= 3) & (x < 3.5),  
-                x >= 3.5,  
-            ],
-            [
-                y_initial,  
-                lambda x: (y_low - y_initial) * (x - 3) / 0.5 + y_initial,  
-                y_low,  
-            ]
-        )
-        return y
-
-
+        self.setAlignment(Qt.AlignCenter)
+        self.setPixmap(self.scaled_frames()[self.current_index])
+
+        # Os quadros seguem o tempo simulado (ver advance), não um timer próprio:
+        # cada batimento percorre todos os quadros, nos instantes tirados da curva de FC
+        self.flips = 0
+        self.followed_rate = None
+        self.set_heart_rate([0.0], [BASELINE_HR])
+
+    def scaled_frames(self):
+        # O redimensionamento suave é caro: é feito uma vez por tamanho do widget
+        if self.frame_cache_size != self.size():
+            self.frame_cache = [frame.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation) for frame in self.frames]
+            self.frame_cache_size = self.size()
+        return self.frame_cache
+
+    def resizeEvent(self, event):
+        self.frame_cache_size = None
+        super().resizeEvent(event)
+        self.setPixmap(self.scaled_frames()[self.current_index])
+
+    @profiled("HeartbeatAnimation.update_image")
+    def update_image(self, steps=1):
+        self.current_index = (self.current_index + steps) % len(self.frames)
+        self.setPixmap(self.scaled_frames()[self.current_index])
+
+    @profiled("HeartbeatAnimation.set_heart_rate")
+    def set_heart_rate(self, t, hr, start_phase=0.0):
+        # Fase acumulada (em batimentos) integrando a FC pelos trapézios. Cada
+        # fração 1/len(frames) de batimento troca o quadro, e os instantes das
+        # trocas são calculados aqui, uma vez; depois do último ponto, a FC final continua.
+        self.beat_t = np.asarray(t, dtype=float)
+        rate = np.maximum(np.asarray(hr, dtype=float), 1.0) / 60
+        self.beat_rate = rate[[0, -1]]
+        self.phase = start_phase + np.concatenate([[0.0], np.cumsum((rate[1:] + rate[:-1]) / 2 * np.diff(self.beat_t))])
+        per_beat = len(self.frames)
+        self.first_flip = int(np.floor(self.phase[0] * per_beat)) + 1
+        self.flip_times = np.interp(np.arange(self.first_flip, int(np.floor(self.phase[-1] * per_beat)) + 1) / per_beat,
+                                    self.phase, self.beat_t)
+        self.followed_rate = None
+        self.window = (np.inf, -np.inf)  # força o cálculo no próximo advance
+
+    def follow_rate(self, time, hr):
+        # Sem a curva inteira de antemão (modos ao vivo e contínuo): a FC mais
+        # recente vale daqui em diante, sem salto na fase do batimento
+        if self.followed_rate is not None and abs(hr - self.followed_rate) < 0.5:
+            return
+        self.set_heart_rate([time], [hr], self.phase_at(time))
+        self.followed_rate = hr
+        self.rate_changed.emit(float(hr))
+
+    def phase_at(self, time):
+        if time < self.beat_t[0]:
+            return self.phase[0] - (self.beat_t[0] - time) * self.beat_rate[0]
+        if time > self.beat_t[-1]:
+            return self.phase[-1] + (time - self.beat_t[-1]) * self.beat_rate[-1]
+        return float(np.interp(time, self.beat_t, self.phase))
+
+    def flip_time(self, flip):
+        # Instante da troca de número `flip`: da tabela ou, fora dela, à FC da ponta
+        k = flip - self.first_flip
+        if 0 <= k < len(self.flip_times):
+            return self.flip_times[k]
+        phase = flip / len(self.frames)
+        if k < 0:
+            return self.beat_t[0] - (self.phase[0] - phase) / self.beat_rate[0]
+        return self.beat_t[-1] + (phase - self.phase[-1]) / self.beat_rate[-1]
+
+    def advance(self, time):
+        # Entre duas trocas agendadas nada muda; a conta só é refeita ao passar
+        # da próxima (ou ao voltar antes da atual, numa busca)
+        if self.window[0] <= time < self.window[1]:
+            return
+        flips = int(np.floor(self.phase_at(time) * len(self.frames)))
+        self.window = (self.flip_time(flips), self.flip_time(flips + 1))
+        if (flips - self.flips) % len(self.frames):
+            self.update_image(flips - self.flips)
+        self.flips = flips
+
+
+class ComparisonView(QLabel):
+    # Todas as drogas lado a lado (comparison.py), desenhadas uma vez numa
+    # imagem: mostrar a tela só exibe o pixmap já pronto para o tamanho atual
+    def __init__(self):
+        super().__init__()
+        self.setAlignment(Qt.AlignCenter)
+        # Sem isso o pixmap ditaria o tamanho do widget e cada desenho o faria crescer
+        self.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self.rendered_size = None
+
+    def prepare(self, size=None):
+        # size: tamanho que o widget terá ao aparecer, para desenhar antes disso
+        size = self.size() if size is None else size
+        if self.rendered_size == size or size.width() < 100 or size.height() < 100:
+            return
+        from comparison import comparison_image
+        image = comparison_image(size.width(), size.height())
+        height, width, _ = image.shape
+        self.setPixmap(QPixmap.fromImage(QImage(image.tobytes(), width, height, 4 * width, QImage.Format_RGBA8888)))
+        self.rendered_size = size
+
+    def showEvent(self, event):
+        self.prepare()
+        super().showEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.isVisible():
+            self.prepare()
+
+
+class MetricItem(QTableWidgetItem):
+    # Ordena pelo valor numérico, com as células sem valor (—) sempre por último
+    def __init__(self, value):
+        super().__init__(format_value(value))
+        self.value = float(value)
+        self.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+    def __lt__(self, other):
+        if not isinstance(other, MetricItem):
+            return super().__lt__(other)
+        return bool((np.isnan(self.value), self.value) < (np.isnan(other.value), other.value))
+
+
+class ReportThread(QThread):
+    # Desenha o relatório em PDF fora da thread da interface, com figuras
+    # próprias (Agg/PDF) montadas só a partir dos dados das páginas
+    progress = pyqtSignal(int, int)
+    rendered = pyqtSignal(bytes)
+    failed = pyqtSignal(str)
+
+    def __init__(self, pages, parent=None):
+        super().__init__(parent)
+        self.pages = pages
+
+    def run(self):
+        import io
+        from report import render_report
+        try:
+            buffer = io.BytesIO()
+            render_report(self.pages, buffer, self.progress.emit)
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        self.rendered.emit(buffer.getvalue())
 
 
 class HeartSimulator(QMainWindow):
@@ -416,24 +215,37 @@ class HeartSimulator(QMainWindow):
         self.setCentralWidget(self.central_widget)
 
         self.heartbeat_animation = HeartbeatAnimation()
-        self.blood_pressure_graph = BloodPressureGraph()
-        self.heart_rate_graph = HeartRateGraph()
+        STARTUP.mark("imagens")
+        # Os gráficos são criados em create_graphs, depois que a janela aparece;
+        # até lá, espaços vazios reservam o lugar deles
+        self.blood_pressure_graph = None
+        self.heart_rate_graph = None
+        self.graph_placeholders = [QWidget(), QWidget()]
 
         self.legend_label = QLabel("Legenda: Nenhuma droga aplicada.")
         self.legend_label.setAlignment(Qt.AlignCenter)
         self.legend_label.setStyleSheet("font-size: 20px; color: black;")
+        self.legend_label.setWordWrap(True)
+
+        # Métricas de cada droga e de cada par, ordenáveis pelo cabeçalho;
+        # preenchida junto com os gráficos, depois da primeira pintura
+        self.metrics_table = QTableWidget(0, len(METRICS) + 1)
+        self.metrics_table.setHorizontalHeaderLabels(["Cenário"] + [title for _, title in METRICS])
+        self.metrics_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.metrics_table.verticalHeader().hide()
+        self.metrics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.metrics_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.metrics_table.setStyleSheet("font-size: 14px;")
+        self.metrics_rows = {}
 
         self.select_label = QLabel("Selecione uma droga para analisar (doses para um cão de 10kg)")
         self.select_label.setAlignment(Qt.AlignCenter)
         self.select_label.setStyleSheet("font-size: 20px; font-weight: bold; color: black;")
 
         self.drug_checkboxes = {}
-        drug_names = [
-            "Noradrenalina 20mcg", "Alfabloqueador", "Neostigmina 0,5mg", 
-            "Adrenalina 20mcg", "Propanolol 10mg", "Pilocarpina 1,5mg", 
-            "Isoprenalina 20mcg", "Acetilcolina 20mcg", "Nicotina 300mg", 
-            "Efedrina 5mg", "Atropina 10mg", "Hexametonio 20mg", "Nenhuma"
-        ]
+        # Uma caixa por droga do catálogo, em colunas na ordem do catálogo
+        drug_names = DRUG_NAMES + ["Nenhuma"]
+        drug_rows = -(-len(drug_names) // 3)
 
         self.main_layout = QVBoxLayout()
         self.top_layout = QHBoxLayout()
@@ -442,39 +254,122 @@ class HeartSimulator(QMainWindow):
         self.grid_layout = QGridLayout()
 
         self.top_layout.addWidget(self.heartbeat_animation)
-        self.graph_layout.addWidget(self.blood_pressure_graph)
-        self.graph_layout.addWidget(self.heart_rate_graph)
-        self.graph_layout.addWidget(self.legend_label)
-        self.top_layout.addLayout(self.graph_layout)
+        for placeholder in self.graph_placeholders:
+            self.graph_layout.addWidget(placeholder)
+        # Os gráficos e a comparação de todas as drogas ocupam o mesmo lugar
+        graph_page = QWidget()
+        graph_page.setLayout(self.graph_layout)
+        self.comparison_view = ComparisonView()
+        self.graph_stack = QStackedWidget()
+        self.graph_stack.addWidget(graph_page)
+        self.graph_stack.addWidget(self.comparison_view)
+        display_layout = QVBoxLayout()
+        display_layout.addWidget(self.graph_stack, 1)
+        info_layout = QHBoxLayout()
+        info_layout.addWidget(self.legend_label, 1)
+        info_layout.addWidget(self.metrics_table, 1)
+        display_layout.addLayout(info_layout)
+        self.top_layout.addLayout(display_layout)
 
         for i, drug in enumerate(drug_names):
             checkbox = QCheckBox(drug)
             checkbox.setStyleSheet("font-size: 20px; padding: 8px;")
             self.drug_checkboxes[drug] = checkbox
-            self.grid_layout.addWidget(checkbox, i // 3, i % 3)
-        
-        self.drug_checkboxes["Alfabloqueador"].stateChanged.connect(self.handle_alfabloqueador_selection)
-        self.drug_checkboxes["Neostigmina 0,5mg"].stateChanged.connect(self.handle_neostigmina_selection)
-        self.drug_checkboxes["Propanolol 10mg"].stateChanged.connect(self.handle_propanolol_selection)
-        self.drug_checkboxes["Atropina 10mg"].stateChanged.connect(self.handle_atropina_selection)
-        self.drug_checkboxes["Hexametonio 20mg"].stateChanged.connect(self.handle_hexametonio_selection)
+            self.grid_layout.addWidget(checkbox, i % drug_rows, i // drug_rows)
+        # Marcar (ou desmarcar) uma droga faz o mesmo com os seus pré-requisitos
+        for drug in DRUG_NAMES:
+            if DRUGS[drug].prerequisites:
+                self.drug_checkboxes[drug].toggled.connect(lambda checked, drug=drug: self.check_prerequisites(drug, checked))
 
 
         self.next_button = QPushButton('Aplicar')
         self.next_button.clicked.connect(self.apply_selected_drugs)
+        self.protocol_button = QPushButton('Protocolo')
+        self.protocol_button.clicked.connect(self.open_protocol)
         self.save_button = QPushButton('Salvar')
         self.save_button.clicked.connect(self.save_graph_to_pdf)
+        self.report_button = QPushButton('Relatório')
+        self.report_button.clicked.connect(self.save_report)
+        self.live_button = QPushButton('Ao vivo')
+        self.live_button.clicked.connect(self.open_live_source)
+        self.session_button = QPushButton('Sessão')
+        self.session_button.clicked.connect(self.open_session)
+        self.compare_button = QPushButton('Comparar')
+        self.compare_button.setCheckable(True)
+        self.compare_button.toggled.connect(self.toggle_comparison)
         self.close_button = QPushButton('Fechar')
         self.close_button.clicked.connect(self.close)
         self.next_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.protocol_button.setStyleSheet("font-size: 22px; padding: 10px;")
         self.save_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.report_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.live_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.session_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.compare_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.export_progress = QProgressBar()
+        self.export_progress.setFormat("PDF %v/%m")
+        self.export_progress.hide()
         self.close_button.setStyleSheet("font-size: 22px; padding: 10px;")
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.next_button)
+        button_layout.addWidget(self.protocol_button)
         button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.report_button)
+        button_layout.addWidget(self.live_button)
+        button_layout.addWidget(self.session_button)
+        button_layout.addWidget(self.compare_button)
+        button_layout.addWidget(self.export_progress)
         button_layout.addWidget(self.close_button)
-        self.grid_layout.addLayout(button_layout, len(drug_names) // 3 + 1, 0, 1, 3)
+        self.grid_layout.addLayout(button_layout, drug_rows + 1, 0, 1, 3)
+
+        self.pause_button = QPushButton('Pausar')
+        self.pause_button.setCheckable(True)
+        self.pause_button.toggled.connect(self.toggle_pause)
+        self.pause_button.setStyleSheet("font-size: 22px; padding: 10px;")
+        self.speed_group = QButtonGroup(self)
+        self.seek_slider = QSlider(Qt.Horizontal)
+        self.seek_slider.setRange(0, 1000)
+        self.seek_slider.sliderMoved.connect(self.seek)
+
+        self.pkpd_checkbox = QCheckBox('Modelo PK/PD')
+        self.pkpd_checkbox.setStyleSheet("font-size: 20px; padding: 8px;")
+        self.population_checkbox = QCheckBox('População')
+        self.population_checkbox.setStyleSheet("font-size: 20px; padding: 8px;")
+        self.population_size = QSpinBox()
+        self.population_size.setRange(100, 100000)
+        self.population_size.setSingleStep(1000)
+        self.population_size.setValue(1000)
+        self.population_size.setStyleSheet("font-size: 20px;")
+        self.continuous_checkbox = QCheckBox('Contínuo')
+        self.continuous_checkbox.setStyleSheet("font-size: 20px; padding: 8px;")
+        self.continuous_checkbox.toggled.connect(self.toggle_continuous)
+        self.continuous_window = QComboBox()
+        self.continuous_window.addItems(CONTINUOUS_WINDOWS)
+        self.continuous_window.setStyleSheet("font-size: 20px;")
+        self.continuous_window.currentTextChanged.connect(self.set_continuous_window)
+        self.waveform_checkbox = QCheckBox('Onda de pulso')
+        self.waveform_checkbox.setStyleSheet("font-size: 20px; padding: 8px;")
+        self.waveform_checkbox.toggled.connect(self.toggle_waveform)
+
+        playback_layout = QHBoxLayout()
+        playback_layout.addWidget(self.pkpd_checkbox)
+        playback_layout.addWidget(self.population_checkbox)
+        playback_layout.addWidget(self.population_size)
+        playback_layout.addWidget(self.continuous_checkbox)
+        playback_layout.addWidget(self.continuous_window)
+        playback_layout.addWidget(self.waveform_checkbox)
+        playback_layout.addWidget(self.pause_button)
+        for label, speed in SimulationClock.SPEEDS.items():
+            speed_button = QPushButton(label)
+            speed_button.setCheckable(True)
+            speed_button.setChecked(speed == 1.0)
+            speed_button.setStyleSheet("font-size: 22px; padding: 10px;")
+            speed_button.clicked.connect(lambda checked, speed=speed: self.clock.set_speed(speed))
+            self.speed_group.addButton(speed_button)
+            playback_layout.addWidget(speed_button)
+        playback_layout.addWidget(self.seek_slider, 1)
+        self.grid_layout.addLayout(playback_layout, drug_rows + 2, 0, 1, 3)
 
         self.main_layout.addLayout(self.top_layout)
         self.main_layout.addWidget(self.select_label)
@@ -482,314 +377,624 @@ class HeartSimulator(QMainWindow):
 
         self.central_widget.setLayout(self.main_layout)
 
-    def handle_alfabloqueador_selection(self, state):
-        if state == Qt.Checked:
-            self.drug_checkboxes["Adrenalina 20mcg"].setChecked(True)
-            self.drug_checkboxes["Noradrenalina 20mcg"].setChecked(True)
-        elif state == Qt.Unchecked:
-            self.drug_checkboxes["Adrenalina 20mcg"].setChecked(False)
-            self.drug_checkboxes["Noradrenalina 20mcg"].setChecked(False)
-    
-    def handle_neostigmina_selection(self, state):
-        if state == Qt.Checked:
-            self.drug_checkboxes["Acetilcolina 20mcg"].setChecked(True)
-        elif state == Qt.Unchecked:
-            self.drug_checkboxes["Acetilcolina 20mcg"].setChecked(False)
-    
-    def handle_propanolol_selection(self, state):
-        if state == Qt.Checked:
-            self.drug_checkboxes["Noradrenalina 20mcg"].setChecked(True)
-            self.drug_checkboxes["Isoprenalina 20mcg"].setChecked(True)
-            self.drug_checkboxes["Adrenalina 20mcg"].setChecked(True)
-        elif state == Qt.Unchecked:
-            self.drug_checkboxes["Noradrenalina 20mcg"].setChecked(False)
-            self.drug_checkboxes["Isoprenalina 20mcg"].setChecked(False)
-            self.drug_checkboxes["Adrenalina 20mcg"].setChecked(False)
-
-    def handle_atropina_selection(self, state):
-        if state == Qt.Checked:
-            self.drug_checkboxes["Acetilcolina 20mcg"].setChecked(True)
-            self.drug_checkboxes["Pilocarpina 1,5mg"].setChecked(True)
-        elif state == Qt.Unchecked:
-            self.drug_checkboxes["Acetilcolina 20mcg"].setChecked(False)
-            self.drug_checkboxes["Pilocarpina 1,5mg"].setChecked(False)
-    
-    def handle_hexametonio_selection(self, state):
-        if state == Qt.Checked:
-            self.drug_checkboxes["Nicotina 300mg"].setChecked(True)
-            self.drug_checkboxes["Atropina 10mg"].setChecked(True)
-        elif state == Qt.Unchecked:
-            self.drug_checkboxes["Nicotina 300mg"].setChecked(False)
-            self.drug_checkboxes["Atropina 10mg"].setChecked(False)
+        # Um único relógio simulado conduz a animação do coração e os dois gráficos
+        self.clock = SimulationClock()
+        self.clock.add_listener(self.heartbeat_animation.advance)
+        self.clock.add_listener(self.update_seek_slider)
+        self.last_tick = time.monotonic()
+        self.clock_timer = QTimer(self)
+        self.clock_timer.timeout.connect(self.tick)
+        self.clock_timer.start(TICK_INTERVAL)
+
+        # Cenário exibido (drogas, modelo, versões), usado como chave do PDF em
+        # cache; None quando o que está na tela não é um cenário fixo (modos
+        # contínuo e ao vivo), que não tem página para exportar
+        self.scenario = None
+        self.scenario_legend = ""
+        self.export_thread = None
+
+        # Modo ao vivo: a fonte escreve num buffer circular em outra thread e
+        # este timer redesenha a janela visível
+        self.live_source = None
+        self.live_buffer = None
+        self.live_seen = 0
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.update_live)
+
+        # Modo contínuo: o relógio corre sem fim, o protocolo é avaliado aos
+        # poucos e só as últimas 4 h ficam guardadas
+        self.continuous = None
+        self.continuous_buffer = None
+        self.clock.add_listener(self.advance_continuous)
+
+        # Onda de pulso: a curva de PA média (e a faixa) da aplicação exibida,
+        # para voltar a ela ao desmarcar, e a onda gerada aos poucos no modo contínuo
+        self.bp_envelope = None
+        self.pulse = None
+        self.waveform_buffer = None
+
+        # Gravação da sessão: ações, legendas e batimentos como eventos e, a
+        # cada avanço do relógio, o tempo simulado e a PA/FC exibidas
+        self.recorder = SessionRecorder(dict(created=time.strftime("%Y-%m-%d %H:%M:%S"),
+                                             curves=CURVES_VERSION, pkpd=PKPD_VERSION))
+        self.recorded_legend = None
+        self.clock.add_listener(self.record_sample)
+        self.heartbeat_animation.rate_changed.connect(lambda rate: self.record_event("batimento", rate))
+        # Reprodução de uma sessão gravada: substitui o relógio pelo da gravação
+        self.replay = None
+        self.replay_time = 0.0
+        self.replay_cursor = 0
+
+        # Tempos de cada callback da animação: F3 mostra/oculta o painel, F4 exporta o rastro
+        self.profiler_overlay = QLabel(self.central_widget)
+        self.profiler_overlay.setStyleSheet("background: rgba(0, 0, 0, 180); color: white; font-family: monospace; font-size: 14px; padding: 6px;")
+        self.profiler_overlay.hide()
+        self.profiler_timer = QTimer(self)
+        self.profiler_timer.timeout.connect(self.update_profiler_overlay)
+        QShortcut(QKeySequence(Qt.Key_F3), self, self.toggle_profiler_overlay)
+        QShortcut(QKeySequence(Qt.Key_F4), self, self.export_trace)
+
+        self.central_widget.installEventFilter(self)
+        STARTUP.mark("janela")
+
+    def eventFilter(self, watched, event):
+        if watched is self.central_widget and event.type() == QEvent.Paint:
+            # Primeira pintura: a janela já está visível, então os gráficos
+            # podem ser montados no próximo ciclo do laço de eventos
+            self.central_widget.removeEventFilter(self)
+            STARTUP.mark("primeira pintura")
+            QTimer.singleShot(0, self.create_graphs)
+        return super().eventFilter(watched, event)
+
+    def create_graphs(self):
+        if self.blood_pressure_graph is not None:
+            return
+        if GRAPH_BACKEND == "qt":
+            from tracewidget import BloodPressureTrace as BloodPressureGraph, HeartRateTrace as HeartRateGraph
+        else:
+            from graphs import BloodPressureGraph, HeartRateGraph
+        self.blood_pressure_graph = BloodPressureGraph()
+        self.heart_rate_graph = HeartRateGraph()
+        for placeholder, graph in zip(self.graph_placeholders, (self.blood_pressure_graph, self.heart_rate_graph)):
+            self.graph_layout.replaceWidget(placeholder, graph)
+            placeholder.deleteLater()
+        self.clock.add_listener(self.blood_pressure_graph.show_time)
+        self.clock.add_listener(self.heart_rate_graph.show_time)
+        self.fill_metrics_table()
+        # A comparação é desenhada já no próximo ciclo, para aparecer sem espera
+        QTimer.singleShot(0, lambda: self.comparison_view.prepare(self.graph_stack.currentWidget().size()))
+        STARTUP.mark("gráficos")
+        if "--startup-report" in sys.argv:
+            STARTUP.print_report()
+
+    def fill_metrics_table(self):
+        names, metrics = scenario_metrics(max_size=2)
+        self.metrics_table.setSortingEnabled(False)
+        # Sem coluna de ordenação: a tabela começa na ordem das drogas
+        self.metrics_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.metrics_table.setRowCount(len(names))
+        for row, name in enumerate(names):
+            item = QTableWidgetItem(name)
+            self.metrics_table.setItem(row, 0, item)
+            self.metrics_rows[frozenset(name.split(" + "))] = item
+            for column, (metric, _) in enumerate(METRICS, 1):
+                self.metrics_table.setItem(row, column, MetricItem(float(metrics[metric][row])))
+        self.metrics_table.setSortingEnabled(True)
+
+    def toggle_comparison(self, visible):
+        self.graph_stack.setCurrentWidget(self.comparison_view if visible else self.graph_stack.widget(0))
+
+    def select_metrics_row(self, drugs):
+        # Destaca a linha do cenário aplicado, se ele estiver na tabela
+        item = self.metrics_rows.get(frozenset(drugs))
+        if item is None:
+            self.metrics_table.clearSelection()
+            return
+        self.metrics_table.selectRow(item.row())
+        self.metrics_table.scrollToItem(item)
+
+    @profiled("HeartSimulator.tick")
+    def tick(self):
+        # O avanço usa o tempo real decorrido, e não a contagem de disparos,
+        # para que atrasos do timer não acumulem desvio
+        if PROFILER.enabled:
+            PROFILER.timer_fired(TICK_INTERVAL / 1000)
+        now = time.monotonic()
+        if self.replay is not None:
+            self.advance_replay(now - self.last_tick)
+        else:
+            self.clock.advance(now - self.last_tick)
+        self.last_tick = now
+
+    def toggle_profiler_overlay(self):
+        visible = not self.profiler_overlay.isVisible()
+        PROFILER.enabled = visible or PROFILER.enabled
+        self.profiler_overlay.setVisible(visible)
+        if visible:
+            self.update_profiler_overlay()
+            self.profiler_timer.start(500)
+        else:
+            self.profiler_timer.stop()
+
+    def update_profiler_overlay(self):
+        self.profiler_overlay.setText(PROFILER.format_summary())
+        self.profiler_overlay.adjustSize()
+        self.profiler_overlay.raise_()
 
+    def export_trace(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Exportar Rastro", "", "Chrome Trace (*.json);;All Files (*)")
+        if file_path:
+            PROFILER.export_chrome_trace(file_path)
+
+    def toggle_pause(self, paused):
+        if paused:
+            self.clock.pause()
+        else:
+            self.clock.resume()
+        self.pause_button.setText('Continuar' if paused else 'Pausar')
+
+    def seek(self, value):
+        if self.replay is not None:
+            self.seek_replay(value / 1000 * self.replay.duration)
+            return
+        self.clock.seek(value / 1000 * self.clock.end_time)
+
+    def update_seek_slider(self, time):
+        if self.seek_slider.isSliderDown():
+            return
+        if self.replay is not None:
+            self.seek_slider.setValue(int(min(self.replay_time / max(self.replay.duration, 1e-9), 1.0) * 1000))
+        elif self.clock.end_time:
+            self.seek_slider.setValue(int(min(time / self.clock.end_time, 1.0) * 1000))
+
+    def check_prerequisites(self, drug, checked):
+        for prerequisite in DRUGS[drug].prerequisites:
+            self.drug_checkboxes[prerequisite].setChecked(checked)
 
     def apply_selected_drugs(self):
-        
+        self.create_graphs()
+        self.stop_live()
         selected_drugs = [drug for drug, checkbox in self.drug_checkboxes.items() if checkbox.isChecked()]
+        if self.continuous is not None:
+            self.administer_continuous([drug for drug in selected_drugs if drug != "Nenhuma"])
+            return
+        self.record_event("execução", text=json.dumps(dict(
+            drogas=selected_drugs, pkpd=self.pkpd_checkbox.isChecked(),
+            populacao=self.population_checkbox.isChecked() and self.population_size.value()), ensure_ascii=False))
         
         self.current_drug = selected_drugs[0] if selected_drugs else "Nenhuma droga aplicada"
-
-        if "Noradrenalina 20mcg" in selected_drugs:
-            self.apply_noradrenalina_effect()
-        if "Adrenalina 20mcg" in selected_drugs:
-            self.apply_adrenalina_effect()
-        if "Isoprenalina 20mcg" in selected_drugs:
-            self.apply_isoprenalina_effect()
-        if "Efedrina 5mg" in selected_drugs:
-            self.apply_efedrina_effect()
-        if "Acetilcolina 20mcg" in selected_drugs:
-            self.apply_acetilcolina_effect()
-        if "Pilocarpina 1,5mg" in selected_drugs:
-            self.apply_pilocarpina_effect()
-        if "Alfabloqueador" in selected_drugs:
-            self.apply_alfabloqueador_effect()
-            self.handle_alfabloqueador_selection(True)
-        if "Neostigmina 0,5mg" in selected_drugs:
-            self.apply_neostigmina_effect()
-            self.handle_neostigmina_selection(True)
-        if "Nicotina 300mg" in selected_drugs:
-            self.apply_nicotina_effect()
-        if "Propanolol 10mg" in selected_drugs:
-            self.apply_propanolol_effect()
-        if "Atropina 10mg" in selected_drugs:
-            self.apply_atropina_effect()
-        if "Hexametonio 20mg" in selected_drugs:
-            self.apply_hexametonio_effect()
-
-
+        self.scenario = ("drogas", tuple(selected_drugs), self.pkpd_checkbox.isChecked(),
+                         self.population_checkbox.isChecked() and self.population_size.value(),
+                         CURVES_VERSION, PKPD_VERSION)
+        self.clock.start_run(RUN_DURATION)
+        plotted = self.heart_rate_graph.y_values
+
+        applied = [drug for drug in selected_drugs if drug in DRUGS]
+        # Entre as drogas marcadas juntas, a exibida é a que vem depois no
+        # catálogo; sem nenhuma, as linhas de base, sem faixa de população
+        displayed = max(applied, key=lambda drug: DRUGS[drug].order) if applied else "Nenhuma"
+        self.apply_drug_effect(displayed)
+        if self.pkpd_checkbox.isChecked():
+            self.apply_pkpd_model(applied)
+        if self.population_checkbox.isChecked() and applied:
+            self.apply_population(displayed)
+        # O batimento segue exatamente a curva de FC desenhada nesta aplicação
+        if self.heart_rate_graph.y_values is not plotted:
+            self.heartbeat_animation.set_heart_rate(self.heart_rate_graph.x_values, self.heart_rate_graph.y_values)
+        else:
+            self.heartbeat_animation.set_heart_rate([0.0], [BASELINE_HR])
+        self.scenario_legend = self.legend_label.text()
+        self.select_metrics_row([drug for drug in selected_drugs if drug != "Nenhuma"])
+        self.keep_envelope()
+
+    def apply_population(self, drug):
+        # Mediana como linha e faixa entre os percentis 5 e 95
+        model = "pkpd" if self.pkpd_checkbox.isChecked() else "curves"
+        # Semente fixa: a mesma população a cada execução, o que permite o cache
+        t, bands = run_population(drug, self.population_size.value(), RUN_DURATION, model=model, seed=0)
+        bp_low, bp_median, bp_high = bands["bp"]
+        hr_low, hr_median, hr_high = bands["hr"]
+        self.blood_pressure_graph.set_curve(t, bp_median, band=(bp_low, bp_high))
+        self.heart_rate_graph.start_animation(hr_median, t, band=(hr_low, hr_high))
+        self.blood_pressure_graph.update_blood_pressure(bp_median)
+
+    def apply_pkpd_model(self, drugs):
+        # Todas as drogas selecionadas dadas juntas em t = 0 a um cão de 10 kg
+        if not drugs:
+            return
+        key = ("pkpd", tuple(drugs), RUN_DURATION, PKPD_VERSION)
+        t, bp, hr = CACHE.get_or_compute(key, lambda: PKPDModel(drugs).simulate(RUN_DURATION))
+        self.blood_pressure_graph.set_curve(t, bp[0])
+        self.heart_rate_graph.start_animation(hr[0], t)
+        self.blood_pressure_graph.update_blood_pressure(bp[0])
+
+
+
+    def open_protocol(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Abrir Protocolo", "", "Protocolos (*.txt *.csv);;All Files (*)")
+        if file_path:
+            try:
+                events = load_protocol(file_path)
+            except ValueError as error:
+                self.legend_label.setText(f"<b>Protocolo inválido:</b> {error}")
+                return
+            self.play_protocol(events)
+
+    def play_protocol(self, events):
+        # Todas as administrações numa única linha do tempo contínua
+        self.create_graphs()
+        self.stop_live()
+        self.continuous_checkbox.setChecked(False)
+        self.record_event("protocolo", text=json.dumps([[event.time, event.drug, event.dose] for event in events], ensure_ascii=False))
+        scenario = ("protocolo", tuple((event.time, event.drug, event.dose) for event in events), CURVES_VERSION)
+        t, bp, hr = CACHE.get_or_compute(scenario, lambda: run_protocol(events))
+        self.current_drug = "Protocolo"
+        self.scenario = scenario
+        self.scenario_legend = "<b>Protocolo:</b><br>" + "<br>".join(f"{event.time:g} s: {event.drug}" for event in events)
+        self.clock.start_run(t[-1])
+        self.blood_pressure_graph.set_curve(t, bp)
+        self.heart_rate_graph.start_animation(hr, t)
+        self.blood_pressure_graph.update_blood_pressure(bp)
+        self.legend_label.setText("<b>Protocolo:</b> aguardando a primeira administração.")
+        for event in events:
+            self.clock.schedule(event.time, lambda event=event: self.legend_label.setText(f"<b>Protocolo ({event.time:g} s):</b> {event.drug}"))
+        self.heartbeat_animation.set_heart_rate(t, hr)
+        self.keep_envelope()
+
+    def open_live_source(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Reproduzir Gravação", "", "Gravações (*.csv *.npy *.npz);;All Files (*)")
+        if file_path:
+            self.start_live(file_path)
+
+    def start_live(self, spec):
+        # spec: gravação reproduzida em tempo real, "-" (entrada padrão) ou "tcp://máquina:porta"
+        self.create_graphs()
+        self.stop_live()
+        self.continuous_checkbox.setChecked(False)
+        buffer = RingBuffer(LIVE_CAPACITY)
+        try:
+            source = open_source(spec, buffer)
+        except (OSError, ValueError) as error:
+            self.legend_label.setText(f"<b>Fonte inválida:</b> {error}")
+            return
+        self.record_event("ao vivo", text=spec)
+        self.clock.start_run(0)
+        self.live_source, self.live_buffer, self.live_seen = source, buffer, 0
+        self.scenario = None
+        self.blood_pressure_graph.start_live(LIVE_WINDOW)
+        self.heart_rate_graph.start_live(LIVE_WINDOW)
+        self.legend_label.setText(f"<b>Ao vivo:</b> {spec}")
+        source.start()
+        self.live_timer.start(LIVE_FRAME_INTERVAL)
+
+    @profiled("HeartSimulator.update_live")
+    def update_live(self):
+        if self.live_buffer.count == self.live_seen:
+            if not self.live_source.running:
+                self.legend_label.setText(f"<b>Ao vivo:</b> {self.live_source.error or 'fonte encerrada'}")
+                self.live_timer.stop()
+            return
+        self.live_seen = self.live_buffer.count
+        samples = self.live_buffer.window(LIVE_WINDOW)
+        self.blood_pressure_graph.show_live(samples[:, 0], samples[:, 1])
+        self.heart_rate_graph.show_live(samples[:, 0], samples[:, 2])
+        self.heartbeat_animation.follow_rate(self.clock.time, samples[-1, 2])
+
+    def stop_live(self):
+        if self.live_source is not None:
+            self.live_source.stop()
+            self.live_source = None
+        self.live_timer.stop()
+
+    def toggle_continuous(self, enabled):
+        if enabled:
+            self.start_continuous()
+        else:
+            self.continuous = None
+            self.seek_slider.setEnabled(True)
+
+    def start_continuous(self):
+        self.create_graphs()
+        self.stop_live()
+        self.record_event("contínuo", text=self.continuous_window.currentText())
+        self.continuous = ProtocolScheduler([], CONTINUOUS_RESOLUTION)
+        self.continuous_buffer = RingBuffer(CONTINUOUS_CAPACITY)
+        self.pulse = PulseSynthesizer(CONTINUOUS_WAVEFORM_RATE)
+        self.waveform_buffer = RingBuffer(WAVEFORM_CAPACITY, columns=2)
+        self.bp_envelope = None
+        self.current_drug = "Contínuo"
+        self.scenario = None
+        # Sem fim definido não há para onde buscar, exceto numa sessão gravada
+        self.seek_slider.setEnabled(self.replay is not None)
+        self.clock.start_run(float("inf"))
+        self.set_continuous_window(self.continuous_window.currentText())
+        self.legend_label.setText("<b>Contínuo:</b> marque as drogas e clique em Aplicar para administrá-las.")
+
+    def set_continuous_window(self, label):
+        if self.continuous is None:
+            return
+        self.blood_pressure_graph.start_live(CONTINUOUS_WINDOWS[label])
+        self.heart_rate_graph.start_live(CONTINUOUS_WINDOWS[label])
+        self.show_continuous()
+
+    def administer_continuous(self, drugs, at=None):
+        # Administração no instante atual (ou no gravado), somada às respostas em andamento
+        at = self.clock.time if at is None else at
+        if drugs:
+            self.record_event("administração", at, json.dumps(drugs, ensure_ascii=False))
+        for drug in drugs:
+            self.continuous.add(ProtocolEvent(at, drug))
+        if drugs:
+            self.legend_label.setText(f"<b>Contínuo ({at:.0f} s):</b> " + ", ".join(drugs)
+                                      + ("<br>" + LEGENDS[drugs[-1]] if drugs[-1] in LEGENDS else ""))
+
+    @profiled("HeartSimulator.advance_continuous")
+    def advance_continuous(self, time):
+        if self.continuous is None:
+            return
+        t, bp, hr = self.continuous.run_until(time)
+        if len(t):
+            self.continuous_buffer.extend(np.column_stack([t, bp, hr]))
+            if self.waveform_checkbox.isChecked():
+                self.waveform_buffer.extend(np.column_stack(self.pulse.generate(t, bp, hr)))
+            self.show_continuous()
+            self.heartbeat_animation.follow_rate(time, hr[-1])
+
+    def show_continuous(self):
+        # A janela pode cobrir horas: LTTB reduz cada curva à largura do gráfico
+        window = CONTINUOUS_WINDOWS[self.continuous_window.currentText()]
+        samples = self.continuous_buffer.window(window)
+        if self.waveform_checkbox.isChecked() and self.waveform_buffer.count:
+            # Na onda, mínimo e máximo por pixel: com batimentos mais estreitos
+            # que um pixel, a linha vira a faixa entre diástole e sístole
+            wave = self.waveform_buffer.window(window)
+            self.blood_pressure_graph.show_live(wave[:, 0], wave[:, 1], downsample=min_max)
+        else:
+            self.blood_pressure_graph.show_live(samples[:, 0], samples[:, 1], downsample=lttb)
+        self.heart_rate_graph.show_live(samples[:, 0], samples[:, 2], downsample=lttb)
+
+    def keep_envelope(self):
+        # Guarda a PA média recém-aplicada e, se marcada, troca-a pela onda de pulso
+        bp = self.blood_pressure_graph
+        self.bp_envelope = None if bp.y is None else (bp.x, bp.y, bp.band_values)
+        if self.waveform_checkbox.isChecked():
+            self.show_waveform(True)
+
+    def toggle_waveform(self, enabled):
+        if self.continuous is not None:
+            # A onda começa (ou recomeça) a partir da próxima amostra
+            self.pulse = PulseSynthesizer(CONTINUOUS_WAVEFORM_RATE)
+            self.waveform_buffer = RingBuffer(WAVEFORM_CAPACITY, columns=2)
+            self.show_continuous()
+        elif self.bp_envelope is not None and not self.blood_pressure_graph.live:
+            self.show_waveform(enabled)
+
+    def show_waveform(self, enabled):
+        # Onda batimento a batimento gerada da PA média e da FC exibidas, ou a PA média
+        x, y, band = self.bp_envelope
+        if enabled:
+            hr = self.heart_rate_graph
+            hr_t, hr_y = (hr.x_values, hr.y_values) if hr.y_values is not None else ([0.0], [BASELINE_HR])
+            t, pressure, _ = synthesize(x, y, hr_t, hr_y, WAVEFORM_RATE, x[0], x[-1])
+            band = band and (np.interp(t, x, band[0]), np.interp(t, x, band[1]))
+            x, y = t, pressure
+        bp = self.blood_pressure_graph
+        bp.set_curve(x, y, band)
+        bp.update_blood_pressure(y)
+        if self.clock.time:
+            bp.show_time(self.clock.time)
+
+    def record_event(self, kind, value=0.0, text=""):
+        if self.recorder is not None and self.replay is None:
+            self.recorder.event(kind, value, text)
+
+    def record_sample(self, time):
+        if self.recorder is None or self.replay is not None:
+            return
+        legend = self.legend_label.text()
+        if legend != self.recorded_legend:
+            self.recorded_legend = legend
+            self.recorder.event("legenda", text=legend)
+        self.recorder.sample(time, *self.displayed_values(time))
+
+    def displayed_values(self, time):
+        # PA e FC mostradas no instante `time`: a última amostra nos modos de
+        # janela deslizante, a curva interpolada nos demais
+        buffer = self.continuous_buffer if self.continuous is not None else self.live_buffer
+        if self.blood_pressure_graph is not None and self.blood_pressure_graph.live and buffer is not None and buffer.count:
+            return buffer.latest(1)[0, 1:]
+        bp, hr = self.blood_pressure_graph, self.heart_rate_graph
+        if bp is None or bp.y is None or hr.y_values is None:
+            return BASELINE_BP, BASELINE_HR
+        return np.interp(time, bp.x, bp.y), np.interp(time, hr.x_values, hr.y_values)
+
+    def save_session(self):
+        if self.recorder is None or not SESSIONS_DIR or not len(self.recorder) or not self.recorder.has_actions():
+            return
+        try:
+            os.makedirs(SESSIONS_DIR, exist_ok=True)
+            self.recorder.save(os.path.join(SESSIONS_DIR, time.strftime("%Y-%m-%d_%H-%M-%S") + SESSION_SUFFIX))
+        except OSError as error:
+            print(f"Sessão não gravada: {error}", file=sys.stderr)
+
+    def open_session(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Reproduzir Sessão", SESSIONS_DIR, f"Sessões (*{SESSION_SUFFIX});;All Files (*)")
+        if file_path:
+            self.start_replay(file_path)
+
+    def start_replay(self, path):
+        try:
+            session = Session(path)
+        except (OSError, ValueError) as error:
+            self.legend_label.setText(f"<b>Sessão inválida:</b> {error}")
+            return
+        self.create_graphs()
+        self.stop_live()
+        self.continuous_checkbox.setChecked(False)
+        self.replay = session
+        self.seek_slider.setEnabled(True)
+        self.seek_replay(0.0)
+
+    def advance_replay(self, real_seconds):
+        if not self.clock.paused:
+            self.replay_time += real_seconds
+        if self.replay_time > self.replay.duration:
+            self.replay = None
+            self.legend_label.setText(self.legend_label.text() + "<br><i>Fim da sessão gravada.</i>")
+            return
+        self.replay_events(self.replay.events_until(self.replay_time))
+        clock_time = self.replay.sample(self.replay_time)[0]
+        if clock_time < self.clock.time:
+            self.clock.seek(clock_time)
+        else:
+            self.clock.run_until(clock_time)
+
+    def seek_replay(self, target):
+        # Volta à última ação que reiniciou a simulação e reaplica o que veio
+        # depois dela; o índice de tempo acha o ponto sem ler a gravação inteira
+        self.replay_time = target
+        start = self.replay.last_event(("execução", "protocolo", "contínuo", "ao vivo"), target)
+        self.replay_cursor = 0 if start is None else start
+        if start is None:
+            self.clock.start_run(0)
+        self.advance_replay(0.0)
+
+    def replay_events(self, end):
+        # Ações e textos gravados até o evento `end`, na ordem em que ocorreram
+        session = self.replay
+        for i in range(self.replay_cursor, end):
+            _, kind, value, text = session.event(i)
+            if kind == "execução":
+                self.replay_execution(json.loads(text))
+            elif kind == "protocolo":
+                self.play_protocol([ProtocolEvent(*event) for event in json.loads(text)])
+            elif kind == "contínuo":
+                self.continuous_window.setCurrentText(text)
+                self.continuous_checkbox.blockSignals(True)
+                self.continuous_checkbox.setChecked(True)
+                self.continuous_checkbox.blockSignals(False)
+                self.start_continuous()
+            elif kind == "administração" and self.continuous is not None:
+                self.clock.run_until(value)
+                self.administer_continuous(json.loads(text), at=value)
+            elif kind == "ao vivo":
+                self.legend_label.setText(f"<b>Ao vivo:</b> {text} (fonte externa, não reproduzida)")
+            elif kind == "legenda":
+                self.legend_label.setText(text)
+            elif kind == "batimento":
+                if session.header["version"] < 2:
+                    # Até a versão 1 o valor era o intervalo entre quadros (700 ms a 100 BPM)
+                    value = 70000 / value
+                self.heartbeat_animation.follow_rate(self.clock.time, value)
+        self.replay_cursor = max(self.replay_cursor, end)
+
+    def replay_execution(self, options):
+        # Marca as mesmas caixas, sem disparar as seleções automáticas, e aplica
+        self.continuous_checkbox.setChecked(False)
+        for drug, checkbox in self.drug_checkboxes.items():
+            checkbox.blockSignals(True)
+            checkbox.setChecked(drug in options["drogas"])
+            checkbox.blockSignals(False)
+        self.pkpd_checkbox.setChecked(options["pkpd"])
+        self.population_checkbox.setChecked(bool(options["populacao"]))
+        if options["populacao"]:
+            self.population_size.setValue(options["populacao"])
+        self.apply_selected_drugs()
 
     def save_graph_to_pdf(self):
+        # Página única com a PA, a FC e a legenda do cenário exibido
+        if self.blood_pressure_graph is None or self.blood_pressure_graph.y is None:
+            return
+        if self.scenario is None:
+            self.legend_label.setText("<b>Nada para exportar:</b> os modos contínuo e ao vivo não geram PDF. "
+                                      "Aplique drogas ou um protocolo.")
+            return
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(self, "Salvar Gráfico como PDF", "", "PDF Files (*.pdf);;All Files (*)", options=options)
-        
         if file_path:
-            from matplotlib.backends.backend_pdf import PdfPages
-            # Criar um PDF e salvar a figura completa
-            with PdfPages(file_path) as pdf:
-                figure = self.blood_pressure_graph.figure  # Acessa a figura completa do gráfico
-                figure.savefig(pdf, format='pdf')
-
-        
-    def apply_noradrenalina_effect(self):
-        self.blood_pressure_graph.apply_drug("Noradrenalina 20mcg")
-        self.legend_label.setText("<b>Noradrenalina:</b> Estímulo dos receptores alfa1 e beta1. Provoca vasoconstrição, que eleva a pressão arterial.<br>Estímulo do beta1 provoca taquicardia e aumenta a pressão sanguínea. <br>Devido ao grande aumento da PA, ocorrem reflexos que vencem o estímulo beta, provocando bradicardia reflexa.")
-        self.heartbeat_animation.set_speed(700)
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(200))
-        QTimer.singleShot(6000, lambda: self.heartbeat_animation.set_speed(700))
-        QTimer.singleShot(9000, lambda: self.heartbeat_animation.set_speed(500))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 4), 
-                                          (self.heart_rate_graph.x >= 4) & (self.heart_rate_graph.x < 6), 
-                                          self.heart_rate_graph.x >= 6],
-                                         [100, 
-                                          lambda x: 100 + (80 - 60) / (4 - 2) * (x - 2), 
-                                          lambda x: 120 - (80 - 60) / (6 - 4) * (x - 4), 
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_noradrenalina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-
-    def apply_adrenalina_effect(self):
-        self.blood_pressure_graph.apply_drug("Adrenalina 20mcg")
-        self.legend_label.setText("<b>Adrenalina:</b> Estímulo dos receptores alfa1, gerando vasoconstrição, beta1 provocando taquicardia e beta2, provocando vasodilatação na área dos músculos. <br>Elevação da PA.")
-        self.heartbeat_animation.set_speed(700)
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(200))
-        QTimer.singleShot(6000, lambda: self.heartbeat_animation.set_speed(700))
-        QTimer.singleShot(9000, lambda: self.heartbeat_animation.set_speed(500))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 4),(self.heart_rate_graph.x >= 4) & (self.heart_rate_graph.x < 6),self.heart_rate_graph.x >= 6],
-                                         [100, 
-                                          lambda x: 100 + (80 - 60) / (4 - 2) * (x - 2), lambda x: 120 - (80 - 60) / (6 - 4) * (x - 4), 
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_adrenalina
-            
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-
-    def apply_isoprenalina_effect(self):
-        self.blood_pressure_graph.apply_drug("Isoprenalina 20mcg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Isoprenalina: </b>Estimulante beta, provoca acentuada taquicardia, vasodilatação e queda da PA. Rapidamente capturada pelos tecidos.")
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(100))
-        QTimer.singleShot(4000, lambda: self.heartbeat_animation.set_speed(700))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >=3) & (self.heart_rate_graph.x < 4), (self.heart_rate_graph.x >=4)],
-                                         [100, 
-                                          lambda x: 100 + (40) / (3 - 2) * (x - 2), lambda x: 140 - (40) / (4 - 3) * (x - 3),
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_isoprenalina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-    
-    def apply_efedrina_effect(self):
-        self.blood_pressure_graph.apply_drug("Efedrina 5mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Efedrina:</b> Pouca atuação em receptores beta. Ligeira taquicardia e hipertensão um pouco acentuada. Absorção mais demorada.")
-        QTimer.singleShot(5000, lambda: self.heartbeat_animation.set_speed(500))
-        QTimer.singleShot(8000, lambda: self.heartbeat_animation.set_speed(700))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 3, 
-                                          (self.heart_rate_graph.x >= 3) & (self.heart_rate_graph.x < 5), (self.heart_rate_graph.x >=5) & (self.heart_rate_graph.x < 8), (self.heart_rate_graph.x >=8)],
-                                         [100, 
-                                          lambda x: 100 + (15) / (5 - 3) * (x - 3), lambda x: 115 - (15) / (8 - 5) * (x - 5),
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_efedrina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-    
-    def apply_acetilcolina_effect(self):
-        self.blood_pressure_graph.apply_drug("Acetilcolina 20mcg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Acetilcolina: </b>Atuação nos receptores muscarínicos. Provoca bradicardia e vasodilatação, resultando em queda da PA.<br> Ação rápida pela degradação por acetilcolinesterase.")
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(900))
-        QTimer.singleShot(4000, lambda: self.heartbeat_animation.set_speed(700))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >=3) & (self.heart_rate_graph.x < 4), (self.heart_rate_graph.x >=4)],
-                                         [100, 
-                                          lambda x: 100 - (20) / (3 - 2) * (x - 2), lambda x: 80 + (20) / (4 - 3) * (x - 3),
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_acetilcolina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-
-    def apply_pilocarpina_effect(self):
-        self.blood_pressure_graph.apply_drug("Pilocarpina 1,5mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Pilocarpina: </b>Estimula receptores muscarínicos, provocando bradicardia e vasodilatação, levando a queda de PA. <br>Ação mais duradoura por não ser metabolizada por colinesterases.")
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(800))
-        QTimer.singleShot(6000, lambda: self.heartbeat_animation.set_speed(700))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 3, 
-                                          (self.heart_rate_graph.x >= 3) & (self.heart_rate_graph.x < 5), (self.heart_rate_graph.x >=5) & (self.heart_rate_graph.x < 7), (self.heart_rate_graph.x >=7)],
-                                         [100, 
-                                          lambda x: 100 + (-15) / (5 - 3) * (x - 3), lambda x: 85 - (-15) / (7 - 5) * (x - 5),
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_pilocarpina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-        
-
-    def apply_alfabloqueador_effect(self):
-        self.blood_pressure_graph.apply_drug("Alfabloqueador")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Alfabloqueador: </b>Bloqueio dos receptores alfa, provocando vasodilatação e hipotensão.<br> Na presença de, primeiro, noradrenalina, há uma pequena taquicardia e elevação da PA. <br>Posteriormente, na presença de Adrenalina, há vasodilatação e provoca hipotensão.")  
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(700))  
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(400))  
-        QTimer.singleShot(3500, lambda: self.heartbeat_animation.set_speed(600))  
-        QTimer.singleShot(5000, lambda: self.heartbeat_animation.set_speed(500))  
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >=3) & (self.heart_rate_graph.x < 3.5), (self.heart_rate_graph.x >=  3.5) & (self.heart_rate_graph.x < 5), (self.heart_rate_graph.x >= 5)],
-                                         [100, 
-                                          lambda x: 100 + (20) / (3 - 2) * (x - 2), lambda x: 120 - (15) / (3.5 - 3) * (x - 3), lambda x: 105 - (-10) / (5 - 3.5) * (x - 3.5),
-                                          115])
-        blood_pressure_values = self.blood_pressure_graph.effect_alfabloqueador
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-        
-    def apply_neostigmina_effect(self):
-        self.blood_pressure_graph.apply_drug("Neostigmina 0,5mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Nesotigmina: </b>Afeta as enzimas que degradam a acetilcolina, causando uma ação mais demorada dela.<br> Provoca uma ligeira queda de PA e, ao administrar 20mcg de Acetilcolina,<br> há uma bradicardia intensa, hipotensão acentuada e aumento da duração do efeito da acetilcolina")
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(800))  
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(1000))  
-        QTimer.singleShot(4000, lambda: self.heartbeat_animation.set_speed(700))  
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >=3) & (self.heart_rate_graph.x < 4), (self.heart_rate_graph.x >=4)],
-                                         [100, 
-                                          lambda x: 100 - (40) / (3 - 2) * (x - 2), lambda x: 60 + (50) / (4 - 3) * (x - 3),
-                                          110])
-        blood_pressure_values = self.blood_pressure_graph.effect_neostigmina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-    
-    def apply_nicotina_effect(self):
-        self.blood_pressure_graph.apply_drug("Nicotina 300mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Nicotina: </b>Atua como estimulante ganglionar, liberando Na nos neurônios pela atuação nos receptores de Ac. <br>Provoca bradicardia e queda da PA ao se ligar aos gânglios parassimpáticos. <br>Ao se ligar aos gânglios simpáticos, provoca taquicardia e hipertensão") 
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(800))  
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(400))  
-        QTimer.singleShot(3500, lambda: self.heartbeat_animation.set_speed(500))  
-        QTimer.singleShot(5000, lambda: self.heartbeat_animation.set_speed(700))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >=3) & (self.heart_rate_graph.x < 3.5), (self.heart_rate_graph.x >=  3.5) & (self.heart_rate_graph.x < 5), (self.heart_rate_graph.x >= 5)],
-                                         [100, 
-                                          lambda x: 100 - (20) / (3 - 2) * (x - 2), lambda x: 80 + (40) / (3.5 - 3) * (x - 3), lambda x: 120 - (20) / (5 - 3.5) * (x - 3.5),
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_nicotina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-    
-    def apply_propanolol_effect(self):
-        self.blood_pressure_graph.apply_drug("Propanolol 10mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Propanolol: </b>Bloqueia os receptores beta 1 e 2. Causa bradicardia e vasoconstrição na área dos músculos esqueléticos. <br>Na presença de Isoprenalina, não se altera a FC e a PA. <br> Na presença de NA e AD, há apenas o aumento da PA") 
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(800))  
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >= 3) ],
-                                         [100, 
-                                          lambda x: 100 - (10) / (3 - 2) * (x - 2),
-                                          90])
-        blood_pressure_values = self.blood_pressure_graph.effect_propanolol
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-   
-
-    def apply_atropina_effect(self):
-        self.blood_pressure_graph.apply_drug("Atropina 10mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Atropina: </b>Bloqueia os receptores muscarínicos. Provoca taquicardia, pois a noradrenalina atua sem o bloqueio da acetilcolina.<br> Com o bloqueio, a administração de 20mcg de Acetilcolina é ineficaz. <br>A aplicação de 2mg de Acetilcolina provoca estímulo ganglionar, liberando noradrenalina nos tecidos, provocando taquicardia e hipertensão.") 
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(500))  
-        QTimer.singleShot(3000, lambda: self.heartbeat_animation.set_speed(400))   
-        QTimer.singleShot(5000, lambda: self.heartbeat_animation.set_speed(700))
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 2, 
-                                          (self.heart_rate_graph.x >= 2) & (self.heart_rate_graph.x < 3), (self.heart_rate_graph.x >=3) & (self.heart_rate_graph.x < 4), (self.heart_rate_graph.x >= 4) & (self.heart_rate_graph.x < 5), (self.heart_rate_graph.x >=5)],
-                                         [100, 
-                                          lambda x: 100 + (20) / (3 - 2) * (x - 2), lambda x: 120 + (10) / (4 - 3) * (x - 3), lambda x: 130 - (30) / (5 - 4) * (x - 4),
-                                          100])
-        blood_pressure_values = self.blood_pressure_graph.effect_atropina
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
-
-    def apply_hexametonio_effect(self):
-        self.blood_pressure_graph.apply_drug("Hexametonio 20mg")
-        self.heartbeat_animation.set_speed(700)
-        self.legend_label.setText("<b>Hexametonio: </b>Bloqueador ganglionar, provoca taquicardia e hipotensão. Mesmo ao aplicar a Nicotina e 2mg de Acetilcolina, <br>pelo bloqueio ganglionar, não apresentam efeito.") 
-        QTimer.singleShot(2000, lambda: self.heartbeat_animation.set_speed(500))  
-        heart_rate_values = np.piecewise(self.heart_rate_graph.x, 
-                                         [self.heart_rate_graph.x < 3, 
-                                          (self.heart_rate_graph.x >= 3) & (self.heart_rate_graph.x < 4), (self.heart_rate_graph.x >= 4) ],
-                                         [100, 
-                                          lambda x: 100 + (15) / (4 - 3) * (x - 3),
-                                          115])
-        blood_pressure_values = self.blood_pressure_graph.effect_hexametonio
-        
-        self.heart_rate_graph.start_animation(heart_rate_values)
-        self.blood_pressure_graph.update_blood_pressure(blood_pressure_values)
+            from report import ReportPage
+            bp, hr = self.blood_pressure_graph, self.heart_rate_graph
+            title = "Protocolo" if self.scenario[0] == "protocolo" else ", ".join(self.scenario[1]) or "Nenhuma droga aplicada"
+            page = ReportPage(title, self.scenario_legend, bp.x, bp.y, hr.x_values, hr.y_values, bp.band_values, hr.band_values)
+            self.export_report([page], file_path, ("pdf",) + self.scenario + (self.waveform_checkbox.isChecked(),))
+
+    def save_report(self):
+        # Apostila com todas as drogas, uma por página
+        options = QFileDialog.Options()
+        file_path, _ = QFileDialog.getSaveFileName(self, "Salvar Relatório", "", "PDF Files (*.pdf);;All Files (*)", options=options)
+        if file_path:
+            from report import drug_pages
+            self.export_report(drug_pages(), file_path, ("relatorio", CURVES_VERSION))
+
+    def export_report(self, pages, file_path, key):
+        if self.export_thread is not None:
+            self.legend_label.setText("<b>Exportação em andamento.</b> Aguarde o término para iniciar outra.")
+            return
+        cached = CACHE.get(key)
+        if cached is not None:
+            self.write_report(cached, file_path, key)
+            return
+        self.export_progress.setRange(0, len(pages))
+        self.export_progress.setValue(0)
+        self.export_progress.show()
+        self.export_thread = ReportThread(pages, self)
+        self.export_thread.progress.connect(lambda done, total: self.export_progress.setValue(done))
+        self.export_thread.rendered.connect(lambda data: self.write_report(data, file_path, key))
+        self.export_thread.failed.connect(self.export_failed)
+        self.export_thread.finished.connect(self.export_finished)
+        self.export_thread.start()
+
+    def write_report(self, data, file_path, key):
+        CACHE.put(key, data)
+        try:
+            with open(file_path, "wb") as f:
+                f.write(data)
+        except OSError as error:
+            # Pasta só de leitura, disco cheio: o PDF continua no cache para a próxima tentativa
+            self.export_failed(error)
+
+    def export_failed(self, error):
+        self.legend_label.setText(f"<b>Falha ao exportar:</b> {error}")
+
+    def closeEvent(self, event):
+        self.stop_live()
+        self.save_session()
+        # Um PDF pela metade seria perdido: espera a exportação em andamento
+        if self.export_thread is not None:
+            self.export_thread.wait()
+        super().closeEvent(event)
+
+    def export_finished(self):
+        self.export_progress.hide()
+        self.export_thread.deleteLater()
+        self.export_thread = None
+
+    def apply_drug_effect(self, drug):
+        self.blood_pressure_graph.apply_drug(drug)
+        self.legend_label.setText(LEGENDS.get(drug, "Legenda: Nenhuma droga aplicada."))
+        heart_rate_x, heart_rate_values = drug_vertices("hr", drug, RUN_DURATION)
+        self.heart_rate_graph.start_animation(heart_rate_values, heart_rate_x)
+        self.blood_pressure_graph.update_blood_pressure(self.blood_pressure_graph.y)
 
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    STARTUP.mark("aplicação Qt")
+    if "--trace" in sys.argv[:-1]:
+        # Grava o rastro da sessão inteira ao fechar o simulador
+        PROFILER.enabled = True
+        trace_path = sys.argv[sys.argv.index("--trace") + 1]
+        app.aboutToQuit.connect(lambda: PROFILER.export_chrome_trace(trace_path))
     simulator = HeartSimulator()
     simulator.showFullScreen()  # Altera para modo tela cheia
     simulator.show()
+    if "--live" in sys.argv[:-1]:
+        # Fonte externa: gravação, "-" (entrada padrão) ou tcp://máquina:porta
+        live_spec = sys.argv[sys.argv.index("--live") + 1]
+        QTimer.singleShot(0, lambda: simulator.start_live(live_spec))
+    if "--replay" in sys.argv[:-1]:
+        # Reproduz uma sessão gravada (ver recording.py)
+        replay_path = sys.argv[sys.argv.index("--replay") + 1]
+        QTimer.singleShot(0, lambda: simulator.start_replay(replay_path))
     sys.exit(app.exec_())
 
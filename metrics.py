@@ -0,0 +1,157 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+
+import numpy as np
+
+from cache import CACHE
+from drugs import BASELINE_BP, BASELINE_HR, DRUG_NAMES, MODEL_VERSION as CURVES_VERSION, resolve_drug
+from protocol import load_protocol, run_protocol
+from simulation import simulate
+
+METRICS_VERSION = 1  # incrementar ao mudar alguma definição abaixo
+RECOVERY_TOLERANCE = 2.0  # mmHg; dentro dela a PA conta como de volta à linha de base
+MAX_LAG = 3.0  # s; maior atraso procurado entre as respostas da FC e da PA
+
+# Nome interno e título de cada coluna, na ordem da tabela e do cache
+METRICS = (
+    ("bp_peak", "PA máx. (mmHg)"),
+    ("bp_nadir", "PA mín. (mmHg)"),
+    ("time_to_peak", "Pico (s)"),
+    ("recovery", "Recuperação (s)"),
+    ("bp_area", "Área do desvio (mmHg·s)"),
+    ("hr_min", "FC mín. (BPM)"),
+    ("hr_max", "FC máx. (BPM)"),
+    ("lag", "Atraso FC-PA (s)"),
+    ("lag_correlation", "Correlação FC-PA"),
+)
+
+
+def trapezoid(y, t):
+    return ((y[:, 1:] + y[:, :-1]) * np.diff(t) / 2).sum(axis=1)
+
+
+def lag_correlation(bp, hr, dt, max_lag=MAX_LAG):
+    # Correlação cruzada normalizada de todas as linhas de uma vez, pela FFT.
+    # Devolve, por linha, o atraso de maior |r| e o r correspondente; atraso
+    # positivo quer dizer que a FC responde depois da PA (reflexo barorreceptor).
+    n = bp.shape[1]
+    a = bp - bp.mean(axis=1, keepdims=True)
+    b = hr - hr.mean(axis=1, keepdims=True)
+    size = 1 << int(2 * n - 1).bit_length()
+    cross = np.fft.irfft(np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size), size)
+    steps = min(int(round(max_lag / dt)), n - 1)
+    lags = np.arange(-steps, steps + 1)
+    norm = np.sqrt((a ** 2).sum(axis=1) * (b ** 2).sum(axis=1))[:, None]
+    r = np.divide(cross[:, lags % size], norm, out=np.zeros((len(a), len(lags))), where=norm > 0)
+    best = np.abs(r).argmax(axis=1)
+    return lags[best] * dt, r[np.arange(len(r)), best]
+
+
+def compute_metrics(t, bp, hr, baseline_bp=BASELINE_BP):
+    # bp e hr: (n_cenários, n_amostras) na mesma grade t; a linha de base da
+    # PA pode ser uma por cenário. Só reduções vetorizadas: o custo por
+    # cenário não passa pelo interpretador.
+    deviation = bp - np.asarray(baseline_bp, dtype=float)[..., None]
+    peak = np.abs(deviation).argmax(axis=1)
+    # Recuperação: primeira amostra depois do último desvio acima da
+    # tolerância; NaN se a PA não volta (bloqueadores) ou nunca saiu dela
+    outside = np.abs(deviation) > RECOVERY_TOLERANCE
+    last = bp.shape[1] - 1 - outside[:, ::-1].argmax(axis=1)
+    recovered = outside.any(axis=1) & (last < bp.shape[1] - 1)
+    recovery = np.where(recovered, t[np.minimum(last + 1, bp.shape[1] - 1)], np.nan)
+    lag, correlation = lag_correlation(bp, hr, t[1] - t[0])
+    return dict(
+        bp_peak=bp.max(axis=1),
+        bp_nadir=bp.min(axis=1),
+        time_to_peak=t[peak],
+        recovery=recovery,
+        bp_area=trapezoid(np.abs(deviation), t),
+        hr_min=hr.min(axis=1),
+        hr_max=hr.max(axis=1),
+        lag=lag,
+        lag_correlation=correlation,
+    )
+
+
+def combinations(count, max_size):
+    # Matriz de pertinência (n_combinações, n_drogas) de todas as combinações
+    # de 1 a max_size drogas, e os índices de cada uma
+    members = [combo for size in range(1, max_size + 1) for combo in itertools.combinations(range(count), size)]
+    matrix = np.zeros((len(members), count))
+    for row, combo in enumerate(members):
+        matrix[row, list(combo)] = 1.0
+    return members, matrix
+
+
+def scenario_metrics(drugs=None, max_size=2, duration=10.0, resolution=0.1):
+    # Métricas de cada droga e de cada combinação. As combinações somam os
+    # desvios da linha de base, como no agendador de protocolos, e são
+    # montadas com um único produto de matrizes sobre as curvas empilhadas.
+    drugs = DRUG_NAMES if drugs is None else [resolve_drug(drug) for drug in drugs]
+    members, matrix = combinations(len(drugs), max_size)
+
+    def compute():
+        result = simulate(drugs, duration, resolution)
+        bp = BASELINE_BP + matrix @ (result.bp - BASELINE_BP)
+        hr = BASELINE_HR + matrix @ (result.hr - BASELINE_HR)
+        metrics = compute_metrics(result.t, bp, hr)
+        return tuple(metrics[name] for name, _ in METRICS)
+
+    key = ("metrics", tuple(drugs), max_size, duration, resolution, CURVES_VERSION, METRICS_VERSION)
+    values = CACHE.get_or_compute(key, compute)
+    names = [" + ".join(drugs[i] for i in combo) for combo in members]
+    return names, dict(zip((name for name, _ in METRICS), values))
+
+
+def protocol_metrics(paths, resolution=0.1):
+    # Variantes de protocolo: cada arquivo é simulado e as curvas são
+    # completadas com o último valor até a mesma duração antes das reduções
+    runs = [run_protocol(load_protocol(path), resolution=resolution) for path in paths]
+    length = max(len(t) for t, _, _ in runs)
+    t = np.arange(length) * resolution
+    bp = np.array([np.pad(bp, (0, length - len(bp)), mode="edge") for _, bp, _ in runs])
+    hr = np.array([np.pad(hr, (0, length - len(hr)), mode="edge") for _, _, hr in runs])
+    return [os.path.basename(path) for path in paths], compute_metrics(t, bp, hr)
+
+
+def format_value(value):
+    return "—" if np.isnan(value) else f"{value:.4g}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Métricas hemodinâmicas de cada droga, combinação ou protocolo.")
+    parser.add_argument("drugs", nargs="*", help="Drogas consideradas (nome completo ou início do nome). Padrão: todas.")
+    parser.add_argument("--combinations", type=int, default=1, help="Maior número de drogas numa combinação.")
+    parser.add_argument("--protocol", nargs="+", help="Arquivos de protocolo comparados entre si, no lugar das drogas.")
+    parser.add_argument("--sort", choices=[name for name, _ in METRICS], help="Ordena pela métrica, da maior para a menor.")
+    parser.add_argument("-o", "--output", help="Grava a tabela em CSV em vez de mostrá-la.")
+    args = parser.parse_args(argv)
+    try:
+        if args.protocol:
+            names, metrics = protocol_metrics(args.protocol)
+        else:
+            names, metrics = scenario_metrics(args.drugs or None, args.combinations)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    order = np.arange(len(names))
+    if args.sort:
+        order = np.argsort(-np.nan_to_num(metrics[args.sort], nan=-np.inf), kind="stable")
+    header = ["Cenário"] + [title for _, title in METRICS]
+    rows = [[names[i]] + [format_value(metrics[name][i]) for name, _ in METRICS] for i in order]
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            csv.writer(f).writerows([header] + rows)
+        return 0
+    width = max(len(name) for name in names + ["Cenário"])
+    print(f"{header[0]:<{width}}  " + "  ".join(header[1:]))
+    for row in rows:
+        print(f"{row[0]:<{width}}  " + "  ".join(f"{value:>{len(title)}}" for value, title in zip(row[1:], header[1:])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import numpy as np
+
+from cache import CACHE
+from drugs import BP_CURVES, HR_CURVES, BASELINE_BP, BASELINE_HR, resolve_drug
+from pkpd import PKPDModel, REFERENCE_WEIGHT
+from protocol import saturating_scale
+from simulation import model_version, time_grid
+
+PERCENTILES = (5, 50, 95)
+
+
+def sample_population(n, rng):
+    # Variabilidade entre animais: peso log-normal em torno de 10 kg, linhas de
+    # base normais em torno de 120 mmHg / 100 BPM e sensibilidade log-normal
+    return dict(
+        weight=np.clip(REFERENCE_WEIGHT * rng.lognormal(0.0, 0.25, n), 3.0, 40.0),
+        baseline_bp=rng.normal(BASELINE_BP, 10.0, n),
+        baseline_hr=rng.normal(BASELINE_HR, 12.0, n),
+        sensitivity=rng.lognormal(0.0, 0.25, n),
+    )
+
+
+class PercentileAggregator:
+    # Histograma por amostra de tempo: cada lote de trajetórias só incrementa
+    # contagens, então a memória depende do número de amostras e de faixas, e
+    # não do número de animais. Os percentis têm a resolução da largura da faixa.
+    def __init__(self, n_samples, low, high, bin_width):
+        self.low = low
+        self.bin_width = bin_width
+        self.n_bins = int(np.ceil((high - low) / bin_width))
+        self.counts = np.zeros((n_samples, self.n_bins), dtype=np.int32)
+        self.rows = np.arange(n_samples) * self.n_bins
+        self.total = 0
+
+    def add(self, batch):
+        bins = np.clip(((batch - self.low) / self.bin_width).astype(np.int64), 0, self.n_bins - 1)
+        flat = (bins + self.rows[None, :]).ravel()
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape).astype(np.int32)
+        self.total += batch.shape[0]
+
+    def percentiles(self, q):
+        cumulative = np.cumsum(self.counts, axis=1)
+        result = []
+        for percentile in q:
+            target = percentile / 100 * self.total
+            index = (cumulative < target).sum(axis=1)
+            # Interpolação linear dentro da faixa em que o percentil cai
+            below = np.where(index > 0, cumulative[np.arange(len(index)), np.maximum(index - 1, 0)], 0)
+            inside = self.counts[np.arange(len(index)), np.minimum(index, self.n_bins - 1)]
+            fraction = np.divide(target - below, inside, out=np.full(len(index), 0.5), where=inside > 0)
+            result.append(self.low + (index + np.clip(fraction, 0, 1)) * self.bin_width)
+        return result
+
+
+def simulate_batch(drug, t, animals, pkpd=None):
+    if pkpd is not None:
+        _, bp, hr = pkpd.simulate(t[-1], t[1] - t[0], weights=animals["weight"],
+                                  baseline_bp=animals["baseline_bp"], baseline_hr=animals["baseline_hr"],
+                                  sensitivity=animals["sensitivity"])
+        return bp, hr
+    # Nas curvas desenhadas, a dose fixa em mg se traduz em mg/kg: o desvio da
+    # linha de base é escalado pela mesma saturação usada nos protocolos
+    scale = animals["sensitivity"] * saturating_scale(REFERENCE_WEIGHT / animals["weight"])
+    bp = animals["baseline_bp"][:, None] + scale[:, None] * (BP_CURVES.evaluate_one(drug, t) - BASELINE_BP)[None, :]
+    hr = animals["baseline_hr"][:, None] + scale[:, None] * (HR_CURVES.evaluate_one(drug, t) - BASELINE_HR)[None, :]
+    return bp, hr
+
+
+def run_population(drug, n=1000, duration=10.0, resolution=0.1, model="curves", batch_size=5000, seed=None):
+    # Devolve t e as faixas {"bp": (p5, p50, p95), "hr": (...)}; as trajetórias
+    # são geradas e agregadas lote a lote, sem guardar todas. Só populações com
+    # semente fixa são reproduzíveis e, portanto, guardadas em cache.
+    drug = resolve_drug(drug)
+    if seed is None:
+        t, *bands = aggregate_population(drug, n, duration, resolution, model, batch_size, seed)
+    else:
+        key = ("population", drug, n, duration, resolution, model, seed, model_version(model))
+        t, *bands = CACHE.get_or_compute(key, lambda: aggregate_population(drug, n, duration, resolution, model, batch_size, seed))
+    return t, {"bp": tuple(bands[:3]), "hr": tuple(bands[3:])}
+
+
+def aggregate_population(drug, n, duration, resolution, model, batch_size, seed):
+    rng = np.random.default_rng(seed)
+    t = time_grid(duration, resolution)
+    pkpd = PKPDModel([drug]) if model == "pkpd" else None
+    bp_stats = PercentileAggregator(len(t), 0.0, 300.0, 0.5)
+    hr_stats = PercentileAggregator(len(t), 0.0, 300.0, 0.5)
+    for start in range(0, n, batch_size):
+        animals = sample_population(min(batch_size, n - start), rng)
+        bp, hr = simulate_batch(drug, t, animals, pkpd)
+        bp_stats.add(bp)
+        hr_stats.add(hr)
+    return (t, *bp_stats.percentiles(PERCENTILES), *hr_stats.percentiles(PERCENTILES))
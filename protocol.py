@@ -0,0 +1,138 @@
+import heapq
+
+import numpy as np
+
+from drugs import BP_CURVES, HR_CURVES, BASELINE_BP, BASELINE_HR, DRUGS, resolve_drug, parse_dose
+
+
+def saturating_scale(ratio):
+    # Emax com EC50 na dose de referência: vale 1 na referência e nunca passa de 2
+    return 2 * ratio / (1 + ratio)
+
+
+def dose_scale(drug, dose):
+    # A curva de cada droga corresponde à dose do seu rótulo; outras doses
+    # escalam o desvio da linha de base com saturação
+    reference = DRUGS[drug].dose
+    if dose is None or reference is None:
+        return 1.0
+    return saturating_scale(dose / reference)
+
+
+class ProtocolEvent:
+    __slots__ = ("time", "drug", "dose")
+
+    def __init__(self, time, drug, dose=None):
+        self.time = float(time)
+        self.drug = resolve_drug(drug)
+        self.dose = DRUGS[self.drug].dose if dose is None else dose
+
+    def __lt__(self, other):
+        return self.time < other.time
+
+    def __repr__(self):
+        return f"ProtocolEvent({self.time!r}, {self.drug!r}, {self.dose!r})"
+
+
+def load_protocol(path):
+    # Uma administração por linha: "tempo em segundos; droga; dose opcional".
+    # O separador é ";" porque nomes e doses usam vírgula decimal.
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            fields = [field.strip() for field in line.split(";")]
+            if len(fields) < 2:
+                raise ValueError(f"{path}:{number}: esperado 'tempo; droga; dose'")
+            try:
+                time = float(fields[0].replace(",", "."))
+            except ValueError:
+                raise ValueError(f"{path}:{number}: tempo inválido: {fields[0]!r}") from None
+            if not np.isfinite(time) or time < 0:
+                raise ValueError(f"{path}:{number}: tempo deve ser finito e não negativo: {fields[0]!r}")
+            dose = None
+            if len(fields) > 2 and fields[2]:
+                dose = parse_dose(fields[2])
+                if dose is None:
+                    raise ValueError(f"{path}:{number}: dose inválida: {fields[2]!r} (ex.: '20mcg', '1,5mg')")
+            try:
+                events.append(ProtocolEvent(time, fields[1], dose))
+            except ValueError as error:
+                raise ValueError(f"{path}:{number}: {error}") from None
+    return events
+
+
+class ProtocolScheduler:
+    # Avança uma linha do tempo contínua entre administrações. As respostas
+    # ativas são somadas à linha de base; quando uma resposta termina, o desvio
+    # que ela deixa (ex.: bloqueadores) passa para um deslocamento constante e ela
+    # sai da lista, de modo que o custo não cresce com a duração do protocolo.
+    def __init__(self, events, resolution=0.1):
+        self.queue = list(events)
+        heapq.heapify(self.queue)
+        self.resolution = resolution
+        self.time = 0.0
+        self.active = []
+        self.bp_offset = 0.0
+        self.hr_offset = 0.0
+
+    def add(self, event):
+        # Administração durante a execução (modo contínuo); um instante que já
+        # passou vale como a próxima amostra
+        heapq.heappush(self.queue, event)
+
+    def pending(self):
+        return len(self.queue)
+
+    def next_event_time(self):
+        return self.queue[0].time if self.queue else None
+
+    def run_until(self, end_time):
+        start = int(round(self.time / self.resolution))
+        stop = int(round(end_time / self.resolution))
+        t = np.arange(start, stop) * self.resolution
+        bp = np.empty_like(t)
+        hr = np.empty_like(t)
+
+        i = 0
+        while i < len(t):
+            while self.queue and self.queue[0].time <= t[i]:
+                event = heapq.heappop(self.queue)
+                self.active.append((event.time, event.drug, dose_scale(event.drug, event.dose)))
+            # Segmento até a próxima administração
+            next_time = self.next_event_time()
+            j = len(t) if next_time is None else max(i + 1, int(np.searchsorted(t, next_time)))
+            self.evaluate_segment(t[i:j], bp[i:j], hr[i:j])
+            i = j
+
+        self.time = stop * self.resolution
+        return t, bp, hr
+
+    def evaluate_segment(self, t, bp, hr):
+        bp[:] = BASELINE_BP + self.bp_offset
+        hr[:] = BASELINE_HR + self.hr_offset
+        if not self.active:
+            return
+        starts = np.array([start for start, _, _ in self.active])[:, None]
+        drugs = [drug for _, drug, _ in self.active]
+        scales = np.array([scale for _, _, scale in self.active])[:, None]
+        local = t[None, :] - starts
+        bp += (scales * (BP_CURVES.evaluate(local, drugs) - BASELINE_BP)).sum(axis=0)
+        hr += (scales * (HR_CURVES.evaluate(local, drugs) - BASELINE_HR)).sum(axis=0)
+
+        finished = [k for k, (start, drug, _) in enumerate(self.active)
+                    if t[-1] - start >= max(BP_CURVES.end_time(drug), HR_CURVES.end_time(drug))]
+        for k in reversed(finished):
+            start, drug, scale = self.active.pop(k)
+            self.bp_offset += scale * (BP_CURVES.final_value(drug) - BASELINE_BP)
+            self.hr_offset += scale * (HR_CURVES.final_value(drug) - BASELINE_HR)
+
+
+def run_protocol(events, duration=None, resolution=0.1, tail=10.0):
+    events = list(events)
+    if duration is None:
+        duration = max((event.time for event in events), default=0.0) + tail
+    scheduler = ProtocolScheduler(events, resolution)
+    return scheduler.run_until(duration + resolution)
@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+# Arquivo de sessão: assinatura, cabeçalho JSON e, alinhados a 8 bytes, uma
+# coluna float32 contígua por campo das amostras, o índice de tempo e a tabela
+# de eventos. Tudo depois do cabeçalho é lido com memmap, sob demanda.
+MAGIC = b"SIMSESS\0"
+FORMAT_VERSION = 2  # 2: batimentos gravados em BPM
+SUFFIX = ".sessao"
+COLUMNS = ("t", "clock", "bp", "hr")  # tempo da sessão, tempo simulado, PA e FC exibidas
+SAMPLE = np.dtype("<f4")
+EVENT = np.dtype([("t", "<f8"), ("kind", "<u1"), ("value", "<f8"), ("text", "<u4")])
+# Ações que mudam o que está sendo simulado, seguidas do que elas exibem
+ACTIONS = ("execução", "protocolo", "contínuo", "administração", "ao vivo")
+KINDS = ACTIONS + ("legenda", "batimento")
+BLOCK = 4096  # amostras por bloco durante a gravação
+INDEX_STRIDE = 1024  # amostras entre entradas do índice de tempo
+
+
+def align(offset, size=8):
+    return -(-offset // size) * size
+
+
+class SessionRecorder:
+    # Grava em blocos float32 de tamanho fixo; a disposição em colunas só é
+    # montada ao salvar, de modo que cada amostra custa uma cópia de 16 bytes
+    def __init__(self, metadata=None):
+        self.metadata = dict(metadata or {})
+        self.origin = time.monotonic()
+        self.blocks = []
+        self.block = np.empty((BLOCK, len(COLUMNS)), dtype=SAMPLE)
+        self.filled = 0
+        self.events = []
+        self.strings = []
+        self.string_index = {}
+
+    def elapsed(self):
+        return time.monotonic() - self.origin
+
+    def sample(self, clock, bp, hr):
+        self.block[self.filled] = (self.elapsed(), clock, bp, hr)
+        self.filled += 1
+        if self.filled == BLOCK:
+            self.blocks.append(self.block)
+            self.block = np.empty_like(self.block)
+            self.filled = 0
+
+    def event(self, kind, value=0.0, text=""):
+        # Textos repetidos (legendas, listas de drogas) são guardados uma vez só
+        index = self.string_index.setdefault(text, len(self.strings))
+        if index == len(self.strings):
+            self.strings.append(text)
+        self.events.append((self.elapsed(), KINDS.index(kind), value, index))
+
+    def __len__(self):
+        return len(self.blocks) * BLOCK + self.filled
+
+    def has_actions(self):
+        return any(KINDS[kind] in ACTIONS for _, kind, _, _ in self.events)
+
+    def samples(self):
+        return np.concatenate(self.blocks + [self.block[:self.filled]])
+
+    def save(self, path):
+        samples = self.samples()
+        events = np.array(self.events, dtype=EVENT)
+        header = dict(self.metadata, version=FORMAT_VERSION, samples=len(samples), events=len(events),
+                      index_stride=INDEX_STRIDE, strings=self.strings)
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        # Escrita atômica, como no cache em disco: uma sessão nunca fica pela metade
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+            f.write(b"\0" * (align(f.tell()) - f.tell()))
+            for column in samples.T:
+                f.write(np.ascontiguousarray(column).tobytes())
+            f.write(samples[::INDEX_STRIDE, 0].tobytes())
+            f.write(b"\0" * (align(f.tell()) - f.tell()))
+            f.write(events.tobytes())
+        os.replace(temporary, path)
+
+
+def mapped(path, dtype, offset, count):
+    # memmap não aceita tamanho zero
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+class Session:
+    # Sessão gravada, aberta sem ler as amostras: só o cabeçalho e o índice de
+    # tempo (uma entrada a cada INDEX_STRIDE amostras) ficam na memória
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: não é uma sessão gravada")
+            size, = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(size).decode("utf-8"))
+        if self.header["version"] > FORMAT_VERSION:
+            raise ValueError(f"{path}: formato de sessão {self.header['version']} mais novo que este simulador")
+        count, self.stride = self.header["samples"], self.header["index_stride"]
+        if count == 0:
+            # Sem amostras não há o que reproduzir nem instante para buscar
+            raise ValueError(f"{path}: sessão sem amostras")
+        offset = align(len(MAGIC) + 4 + size)
+        self.columns = {}
+        for name in COLUMNS:
+            self.columns[name] = mapped(path, SAMPLE, offset, count)
+            offset += count * SAMPLE.itemsize
+        entries = -(-count // self.stride)
+        self.index = np.array(mapped(path, SAMPLE, offset, entries))
+        self.events = mapped(path, EVENT, align(offset + entries * SAMPLE.itemsize), self.header["events"])
+        self.strings = self.header["strings"]
+
+    def __len__(self):
+        return self.header["samples"]
+
+    @property
+    def t(self):
+        return self.columns["t"]
+
+    @property
+    def duration(self):
+        return float(self.t[-1])
+
+    def position(self, time):
+        # Última amostra com tempo <= time: busca binária no índice e depois
+        # num único trecho de INDEX_STRIDE amostras do arquivo (-1 se nenhuma)
+        block = max(int(np.searchsorted(self.index, time, side="right")) - 1, 0)
+        start = block * self.stride
+        chunk = np.asarray(self.t[start:start + self.stride])
+        return start + int(np.searchsorted(chunk, time, side="right")) - 1
+
+    def sample(self, time):
+        # (tempo simulado, PA, FC) exibidos no instante `time` da sessão
+        i = max(self.position(time), 0)
+        return tuple(float(self.columns[name][i]) for name in COLUMNS[1:])
+
+    def events_until(self, time):
+        # Quantidade de eventos com tempo <= time (são gravados em ordem)
+        return int(np.searchsorted(self.events["t"], time, side="right"))
+
+    def last_event(self, kinds, time, chunk=256):
+        # Índice do último evento de um dos tipos até `time`, lendo o arquivo
+        # de trás para frente em trechos curtos; None se não houver
+        codes = [KINDS.index(kind) for kind in kinds]
+        end = self.events_until(time)
+        while end > 0:
+            start = max(end - chunk, 0)
+            found = np.flatnonzero(np.isin(self.events["kind"][start:end], codes))
+            if len(found):
+                return start + int(found[-1])
+            end = start
+        return None
+
+    def event(self, i):
+        # (tempo, tipo, valor, texto) do evento i
+        t, kind, value, text = self.events[i]
+        return float(t), KINDS[kind], float(value), self.strings[text]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumo de uma sessão gravada pelo simulador.")
+    parser.add_argument("session", help=f"Arquivo de sessão ({SUFFIX}).")
+    parser.add_argument("--at", type=float, help="Mostra o estado exibido neste instante da sessão (s).")
+    parser.add_argument("--events", action="store_true", help="Lista todas as ações gravadas.")
+    args = parser.parse_args(argv)
+    try:
+        session = Session(args.session)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    kinds = Counter(KINDS[kind] for kind in session.events["kind"])
+    print(f"{session.header.get('created', '?')}: {session.duration:.1f} s, {len(session)} amostras, "
+          + ", ".join(f"{count} {kind}" for kind, count in kinds.items()))
+    if args.events:
+        for i in range(len(session.events)):
+            t, kind, value, text = session.event(i)
+            if kind in ACTIONS:
+                print(f"{t:8.1f} s  {kind:<14} {text}")
+    if args.at is not None:
+        clock, bp, hr = session.sample(args.at)
+        legend = session.last_event(["legenda"], args.at)
+        print(f"{args.at:.1f} s: tempo simulado {clock:.1f} s, PA {bp:.0f} mmHg, FC {hr:.0f} BPM")
+        if legend is not None:
+            print(session.event(legend)[3])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import argparse
+import re
+import sys
+import textwrap
+
+import numpy as np
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from drugs import DRUG_NAMES, LEGENDS, resolve_drug
+from simulation import drug_vertices
+
+A4 = (8.27, 11.69)  # polegadas
+
+
+class ReportPage:
+    # Uma página do relatório: curvas de PA e FC (com a faixa de percentis
+    # opcional) e o texto da legenda. Só dados, para poder ser desenhada fora
+    # da thread da interface.
+    def __init__(self, title, legend, bp_t, bp, hr_t, hr, bp_band=None, hr_band=None):
+        self.title = title
+        self.legend = legend
+        self.bp_t = np.asarray(bp_t)
+        self.bp = np.asarray(bp)
+        self.hr_t = np.asarray(hr_t)
+        self.hr = np.asarray(hr)
+        self.bp_band = bp_band
+        self.hr_band = hr_band
+
+
+def plain_text(html):
+    # Legendas usam o HTML simples do QLabel; no PDF viram texto com quebras de linha
+    text = re.sub(r"<br\s*/?>", "\n", html)
+    return re.sub(r"<[^>]+>", "", text)
+
+
+def drug_pages(drugs=None, duration=10.0):
+    # Apostila: uma página por droga, com as curvas exatas (vértices das tabelas)
+    drugs = DRUG_NAMES if drugs is None else [resolve_drug(drug) for drug in drugs]
+    return [ReportPage(drug, LEGENDS.get(drug, ""), *drug_vertices("bp", drug, duration), *drug_vertices("hr", drug, duration))
+            for drug in drugs]
+
+
+def render_page(page):
+    fig = Figure(figsize=A4)
+    fig.suptitle(page.title, fontsize=16)
+    # Margens fixas: tight_layout desenharia cada página uma vez a mais só para medi-la
+    bp_ax, hr_ax, text_ax = fig.subplots(3, 1, gridspec_kw=dict(height_ratios=[3, 3, 2], hspace=0.3,
+                                                                left=0.1, right=0.95, top=0.93, bottom=0.04))
+    for ax, t, y, band, title, unit in ((bp_ax, page.bp_t, page.bp, page.bp_band, "Pressão Arterial", "mmHg"),
+                                        (hr_ax, page.hr_t, page.hr, page.hr_band, "Frequência Cardíaca", "BPM")):
+        line, = ax.plot(t, y, lw=2)
+        if band is not None:
+            ax.fill_between(t, band[0], band[1], color=line.get_color(), alpha=0.3, lw=0)
+        ax.set_title(title)
+        ax.set_ylabel(unit)
+        ax.set_xlim(t[0], t[-1])
+        ax.grid(alpha=0.3)
+    hr_ax.set_xlabel("Tempo (s)")
+    text_ax.axis("off")
+    paragraphs = [textwrap.fill(line.strip(), 95) for line in plain_text(page.legend).splitlines() if line.strip()]
+    text_ax.text(0, 1, "\n".join(paragraphs), va="top", fontsize=10)
+    return fig
+
+
+def render_report(pages, output, progress=None):
+    # output: caminho ou arquivo binário; progress(feitas, total) após cada página
+    with PdfPages(output) as pdf:
+        for done, page in enumerate(pages, 1):
+            pdf.savefig(render_page(page))
+            if progress is not None:
+                progress(done, len(pages))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera o relatório em PDF (PA, FC e legenda) de cada droga, sem interface gráfica.")
+    parser.add_argument("drugs", nargs="*", help="Drogas do relatório (nome completo ou início do nome). Padrão: todas.")
+    parser.add_argument("-o", "--output", default="relatorio.pdf", help="Arquivo PDF de saída.")
+    args = parser.parse_args(argv)
+    try:
+        pages = drug_pages(args.drugs or None)
+    except ValueError as error:
+        parser.error(str(error))
+    render_report(pages, args.output, lambda done, total: print(f"{done}/{total}", file=sys.stderr))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import struct
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from drugs import DRUG_NAMES, LEGENDS, resolve_drug
+from instrumentation import PROFILER, profiled
+from protocol import ProtocolEvent, ProtocolScheduler, load_protocol
+from sources import RECORD, RingBuffer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+VIEWER_PAGE = os.path.join(ROOT, "assets", "visualizador.html")
+DEFAULT_PORT = 8765
+FRAME_RATE = 10  # quadros por segundo enviados a todos os clientes, qualquer que seja o número deles
+RESOLUTION = 0.1  # s entre amostras da linha do tempo compartilhada, como no modo contínuo
+HISTORY = 600.0  # s de histórico enviados a quem conecta no meio da aula
+MAX_BACKLOG = 256 * 1024  # bytes pendentes de um cliente lento antes de ele perder quadros
+MAX_REQUEST = 64 * 1024  # bytes de cabeçalho, corpo ou mensagem aceitos de um cliente
+# Quadro binário: número do quadro e fase do batimento (0 a 1) na última
+# amostra, seguidos de registros (tempo, PA, FC) float32 como em sources.py
+FRAME_HEADER = struct.Struct("<If")
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TEXT, BINARY, CLOSE, PING, PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+STATUS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def websocket_frame(payload, opcode=BINARY):
+    # Mensagem inteira num quadro só, sem máscara (servidor para cliente)
+    size = len(payload)
+    if size < 126:
+        header = struct.pack("!BB", 0x80 | opcode, size)
+    elif size < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, size)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+    return header + payload
+
+
+async def read_websocket_frame(reader):
+    # (opcode, conteúdo) do próximo quadro, com ou sem máscara
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size, = struct.unpack("!H", await reader.readexactly(2))
+    elif size == 127:
+        size, = struct.unpack("!Q", await reader.readexactly(8))
+    if size > MAX_REQUEST:
+        raise ValueError("mensagem grande demais")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(size)
+    if mask is not None:
+        payload = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(mask, np.uint8), size)).tobytes()
+    return first & 0x0F, payload
+
+
+def encode_frame(sequence, phase, samples):
+    return FRAME_HEADER.pack(sequence, phase) + samples.astype(RECORD).tobytes()
+
+
+class Classroom:
+    # Aula compartilhada: uma única linha do tempo avançada em tempo real no
+    # servidor, com os clientes só exibindo o que recebem. Cada quadro é
+    # montado uma vez e os mesmos bytes vão para todos, de modo que um cliente
+    # a mais custa apenas a escrita no seu socket.
+    def __init__(self, events=(), frame_rate=FRAME_RATE, token=None):
+        events = sorted(events)
+        self.scheduler = ProtocolScheduler(events, RESOLUTION)
+        self.announcements = [(event.time, [event.drug]) for event in events]  # protocolo ainda não anunciado
+        self.history = RingBuffer(int(HISTORY / RESOLUTION))
+        self.frame_rate = frame_rate
+        self.token = token
+        self.origin = None
+        self.sequence = 0
+        self.beats = 0.0  # batimentos acumulados, para a fase enviada em cada quadro
+        self.websockets = set()
+        self.streams = set()  # conexões TCP no formato de sources.py (main.py --live tcp://...)
+        self.administered = []
+        self.legend = ""
+        self.dropped = 0
+
+    def now(self):
+        return asyncio.get_running_loop().time() - self.origin
+
+    def state(self):
+        return dict(tipo="estado", tempo=round(self.scheduler.time, 3), drogas=DRUG_NAMES, administradas=self.administered,
+                    legenda=self.legend, clientes=len(self.websockets) + len(self.streams),
+                    quadros_por_segundo=self.frame_rate, resolucao=RESOLUTION, perdidos=self.dropped)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.origin = loop.time()
+        period = 1 / self.frame_rate
+        while True:
+            PROFILER.timer_fired(period)
+            self.tick()
+            # Próximo quadro alinhado à grade de períodos: atrasos não se acumulam
+            await asyncio.sleep(period - (loop.time() - self.origin) % period)
+
+    @profiled("Classroom.tick")
+    def tick(self):
+        t, bp, hr = self.scheduler.run_until(self.now())
+        while self.announcements and self.announcements[0][0] <= self.scheduler.time:
+            self.announce(*self.announcements.pop(0))
+        if not len(t):
+            return
+        beats = self.beats + np.cumsum(hr) * RESOLUTION / 60
+        self.beats = beats[-1] % 1.0
+        samples = np.column_stack([t, bp, hr])
+        self.history.extend(samples)
+        self.sequence += 1
+        records = samples.astype(RECORD).tobytes()
+        self.broadcast(self.websockets, websocket_frame(FRAME_HEADER.pack(self.sequence, self.beats) + records))
+        self.broadcast(self.streams, records)
+
+    def broadcast(self, writers, data):
+        # Escrita sem esperar: um cliente lento acumula no buffer do socket
+        # até MAX_BACKLOG e, a partir daí, perde quadros em vez de atrasar os outros
+        for writer in list(writers):
+            if writer.transport.is_closing():
+                writers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                self.dropped += 1
+            else:
+                writer.write(data)
+
+    def administer(self, drugs):
+        at = round(self.scheduler.time, 3)
+        for drug in drugs:
+            self.scheduler.add(ProtocolEvent(at, drug))
+        self.announce(at, drugs)
+        return at
+
+    def announce(self, at, drugs):
+        self.administered += [dict(tempo=at, droga=drug) for drug in drugs]
+        self.legend = LEGENDS[drugs[-1]]
+        message = dict(tipo="administração", tempo=at, drogas=drugs, legenda=self.legend)
+        self.broadcast(self.websockets, websocket_frame(json.dumps(message, ensure_ascii=False).encode("utf-8"), TEXT))
+
+    def authorized(self, writer, query):
+        # Só a máquina do professor administra drogas, ou quem tiver o token
+        host = writer.get_extra_info("peername")[0]
+        if ipaddress.ip_address(host.split("%")[0]).is_loopback:
+            return True
+        return self.token is not None and hmac.compare_digest(query.get("token", [""])[0], self.token)
+
+    async def handle_http(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(":") for line in lines[1:] if line)}
+            url = urlsplit(target)
+            if url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self.serve_websocket(reader, writer, headers)
+            elif url.path == "/" and method == "GET":
+                with open(VIEWER_PAGE, "rb") as f:
+                    self.respond(writer, 200, f.read(), "text/html; charset=utf-8")
+            elif url.path == "/estado" and method == "GET":
+                self.respond_json(writer, 200, self.state())
+            elif url.path == "/administrar":
+                await self.handle_administer(reader, writer, method, headers, parse_qs(url.query))
+            else:
+                self.respond_json(writer, 404, dict(erro=f"{url.path} não existe"))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_administer(self, reader, writer, method, headers, query):
+        # POST /administrar com {"drogas": [...]} ou ?droga=...&droga=...
+        if method != "POST":
+            return self.respond_json(writer, 405, dict(erro="use POST"))
+        if not self.authorized(writer, query):
+            return self.respond_json(writer, 403, dict(erro="administração só pela máquina do professor"))
+        size = int(headers.get("content-length", 0))
+        if size > MAX_REQUEST:
+            return self.respond_json(writer, 400, dict(erro="corpo grande demais"))
+        body = await reader.readexactly(size) if size else b""
+        try:
+            names = json.loads(body)["drogas"] if body else query.get("droga", [])
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                raise TypeError("'drogas' deve ser uma lista de nomes")
+            drugs = [resolve_drug(name) for name in names]
+        except (ValueError, KeyError, TypeError) as error:
+            return self.respond_json(writer, 400, dict(erro=str(error)))
+        if not drugs:
+            return self.respond_json(writer, 400, dict(erro="nenhuma droga informada"))
+        at = self.administer(drugs)
+        self.respond_json(writer, 200, dict(tempo=at, drogas=drugs))
+
+    def respond(self, writer, status, body, content_type):
+        writer.write(f"HTTP/1.1 {status} {STATUS[status]}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+
+    def respond_json(self, writer, status, data):
+        self.respond(writer, status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    async def serve_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "").encode("latin-1")
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest()).decode("latin-1")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        # Quem entra no meio da aula recebe o estado e o histórico recente antes dos quadros ao vivo
+        writer.write(websocket_frame(json.dumps(self.state(), ensure_ascii=False).encode("utf-8"), TEXT))
+        writer.write(websocket_frame(encode_frame(self.sequence, self.beats, self.history.latest())))
+        self.websockets.add(writer)
+        try:
+            # Os visualizadores não enviam dados; só o fechamento e pings são tratados
+            while True:
+                opcode, payload = await read_websocket_frame(reader)
+                if opcode == CLOSE:
+                    writer.write(websocket_frame(payload[:2], CLOSE))
+                    break
+                if opcode == PING:
+                    writer.write(websocket_frame(payload, PONG))
+        finally:
+            self.websockets.discard(writer)
+
+    async def handle_stream(self, reader, writer):
+        # Fluxo binário contínuo, lido pelo próprio simulador em modo ao vivo
+        writer.write(self.history.latest().astype(RECORD).tobytes())
+        self.streams.add(writer)
+        try:
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self.streams.discard(writer)
+            writer.close()
+
+
+async def watch(port, received):
+    # Visualizador mínimo para testes de carga: conecta e conta os quadros recebidos
+    reader, writer = await asyncio.open_connection("localhost", port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write(b"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Version: 13\r\nSec-WebSocket-Key: " + key + b"\r\n\r\n")
+    await reader.readuntil(b"\r\n\r\n")
+    index = len(received)
+    received.append(0)
+    try:
+        while True:
+            opcode, _ = await read_websocket_frame(reader)
+            received[index] += opcode == BINARY
+    finally:
+        writer.close()
+
+
+async def serve(args, events):
+    classroom = Classroom(events, args.rate, args.token)
+    http = await asyncio.start_server(classroom.handle_http, args.host, args.port, limit=MAX_REQUEST)
+    servers = [http]
+    if args.stream_port is not None:
+        servers.append(await asyncio.start_server(classroom.handle_stream, args.host, args.stream_port))
+    port = http.sockets[0].getsockname()[1]
+    print(f"Aula em http://{args.host}:{port}/ ({len(events)} administrações no protocolo)", file=sys.stderr)
+    ticker = asyncio.create_task(classroom.run())
+    if not args.viewers:
+        await ticker
+        return
+    # Teste de carga local: visualizadores no mesmo processo, fora da medição de Classroom.tick
+    PROFILER.enabled = True
+    received = []
+    viewers = [asyncio.create_task(watch(port, received)) for _ in range(args.viewers)]
+    await asyncio.sleep(args.duration)
+    print(f"{len(received)} visualizadores, quadros recebidos por cada um: mín. {min(received, default=0)}, "
+          f"máx. {max(received, default=0)}; {classroom.dropped} perdidos", file=sys.stderr)
+    print(PROFILER.format_summary(args.duration), file=sys.stderr)
+    for task in viewers + [ticker]:
+        task.cancel()
+    await asyncio.gather(*viewers, ticker, return_exceptions=True)
+    for server in servers:
+        server.close()
+    # Deixa as conexões do lado do servidor perceberem o fechamento dos visualizadores
+    await asyncio.sleep(0.1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de aula: uma simulação compartilhada exibida por muitos visualizadores.")
+    parser.add_argument("--host", default="localhost", help="Endereço de escuta (0.0.0.0 para aceitar o laboratório inteiro).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Porta HTTP e WebSocket (0 escolhe uma livre).")
+    parser.add_argument("--stream-port", type=int, help="Porta TCP com o fluxo binário lido por main.py --live tcp://máquina:porta.")
+    parser.add_argument("--protocol", help="Protocolo de administração seguido pela aula (formato de protocol.py).")
+    parser.add_argument("--rate", type=float, default=FRAME_RATE, help="Quadros por segundo enviados aos clientes.")
+    parser.add_argument("--token", help="Permite administrar drogas de outras máquinas com ?token=...")
+    parser.add_argument("--viewers", type=int, default=0, help="Teste de carga: conecta este número de visualizadores locais.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duração do teste de carga (s).")
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error("A taxa de quadros deve ser positiva")
+    try:
+        events = load_protocol(args.protocol) if args.protocol else []
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    try:
+        asyncio.run(serve(args, events))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
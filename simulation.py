@@ -0,0 +1,113 @@
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from cache import CACHE
+from drugs import BP_CURVES, HR_CURVES, DRUG_NAMES, MODEL_VERSION as CURVES_VERSION, resolve_drug
+from protocol import load_protocol, run_protocol
+from pkpd import PKPDModel, REFERENCE_WEIGHT, MODEL_VERSION as PKPD_VERSION
+
+MODELS = ("curves", "pkpd")
+
+
+class SimulationResult:
+    def __init__(self, drugs, t, bp, hr):
+        self.drugs = list(drugs)
+        self.t = t
+        self.bp = bp
+        self.hr = hr
+
+    def columns(self):
+        header = ["tempo"]
+        header += [f"PA {drug}" for drug in self.drugs]
+        header += [f"FC {drug}" for drug in self.drugs]
+        return header
+
+    def as_array(self):
+        # Mesma ordem de colunas do CSV: tempo, PA de cada droga, FC de cada droga
+        return np.vstack([self.t[None, :], self.bp, self.hr])
+
+
+def check_grid(duration, resolution):
+    # Duração None: até o fim do protocolo
+    if (duration is not None and duration <= 0) or resolution <= 0:
+        raise ValueError("A duração e a resolução devem ser positivas")
+
+
+def time_grid(duration=10.0, resolution=0.1):
+    check_grid(duration, resolution)
+    return np.linspace(0, duration, int(round(duration / resolution)) + 1)
+
+
+def model_version(model):
+    return PKPD_VERSION if model == "pkpd" else CURVES_VERSION
+
+
+def drug_vertices(kind, drug, duration=10.0):
+    # Vértices exatos da curva em [0, duration]; a animação interpola entre eles
+    bank = BP_CURVES if kind == "bp" else HR_CURVES
+    return bank.vertices(drug, 0.0, duration)
+
+
+def compute_curves(drugs, duration, resolution, model, weight):
+    t = time_grid(duration, resolution)
+    if model == "pkpd":
+        # Um animal por droga, cada um recebendo apenas a dose do rótulo
+        pkpd = PKPDModel(drugs)
+        return pkpd.simulate(duration, resolution, doses=np.diag(pkpd.reference_doses()), weights=weight)
+    return t, BP_CURVES.evaluate(t, drugs), HR_CURVES.evaluate(t, drugs)
+
+
+def simulate(drugs=None, duration=10.0, resolution=0.1, model="curves", weight=REFERENCE_WEIGHT):
+    drugs = DRUG_NAMES if drugs is None else [resolve_drug(drug) for drug in drugs]
+    key = ("simulate", tuple(drugs), duration, resolution, model, weight, model_version(model))
+    t, bp, hr = CACHE.get_or_compute(key, lambda: compute_curves(drugs, duration, resolution, model, weight))
+    return SimulationResult(drugs, t, bp, hr)
+
+
+def simulate_protocol(path, duration=None, resolution=0.1):
+    check_grid(duration, resolution)
+    t, bp, hr = run_protocol(load_protocol(path), duration, resolution)
+    return SimulationResult(["Protocolo"], t, bp[None, :], hr[None, :])
+
+
+def save_result(result, path):
+    if path.endswith(".npz"):
+        np.savez(path, t=result.t, bp=result.bp, hr=result.hr, drugs=np.array(result.drugs))
+    elif path.endswith(".npy"):
+        np.save(path, result.as_array())
+    else:
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerow(result.columns())
+            np.savetxt(f, result.as_array().T, delimiter=",", fmt="%.6g")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulação em lote das curvas de PA e FC, sem interface gráfica.")
+    parser.add_argument("drugs", nargs="*", help="Drogas a simular (nome completo ou início do nome). Padrão: todas.")
+    parser.add_argument("--protocol", help="Arquivo de protocolo (tempo; droga; dose) simulado numa linha do tempo contínua.")
+    parser.add_argument("--duration", type=float, help="Duração da simulação em segundos (padrão: 10, ou o fim do protocolo).")
+    parser.add_argument("--resolution", type=float, default=0.1, help="Intervalo entre amostras em segundos.")
+    parser.add_argument("--model", choices=MODELS, default="curves", help="Curvas desenhadas ou modelo farmacocinético/farmacodinâmico.")
+    parser.add_argument("--weight", type=float, default=REFERENCE_WEIGHT, help="Peso do animal em kg (modelo PK/PD).")
+    parser.add_argument("--cache-dir", help="Pasta do cache em disco, reaproveitado entre execuções.")
+    parser.add_argument("-o", "--output", default="simulacao.csv", help="Arquivo de saída (.csv, .npy ou .npz).")
+    args = parser.parse_args(argv)
+    if args.cache_dir:
+        CACHE.configure(directory=args.cache_dir)
+
+    try:
+        if args.protocol:
+            result = simulate_protocol(args.protocol, args.duration, args.resolution)
+        else:
+            result = simulate(args.drugs or None, 10.0 if args.duration is None else args.duration, args.resolution, args.model, args.weight)
+    except ValueError as error:
+        parser.error(str(error))
+    save_result(result, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import argparse
+import csv
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from drugs import BP_CURVES, HR_CURVES, resolve_drug
+
+# Amostras transmitidas como float32 little-endian: tempo (s), PA (mmHg), FC (BPM)
+RECORD = np.dtype("<f4")
+RECORD_SIZE = 3 * RECORD.itemsize
+CONNECT_TIMEOUT = 5.0  # s; uma máquina inalcançável não espera o limite do sistema, que chega a minutos
+
+
+class RingBuffer:
+    # Últimas `capacity` amostras (tempo, PA, FC) numa matriz alocada uma vez:
+    # a memória não cresce durante a sessão. Uma thread de aquisição escreve e
+    # a interface lê cópias da janela visível.
+    def __init__(self, capacity, columns=3):
+        self.data = np.empty((capacity, columns))
+        self.capacity = capacity
+        self.count = 0  # total já recebido; a posição de escrita é count % capacity
+        self.lock = threading.Lock()
+
+    def extend(self, samples):
+        samples = np.asarray(samples, dtype=float)[-self.capacity:]
+        with self.lock:
+            start = self.count % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:len(samples) - first] = samples[first:]
+            self.count += len(samples)
+
+    def segments(self):
+        # Trechos (mais antigo, mais novo) do conteúdo em ordem cronológica, sem cópia
+        n = min(self.count, self.capacity)
+        start = (self.count - n) % self.capacity
+        older = self.data[start:start + n]
+        return older, self.data[:n - len(older)]
+
+    def latest(self, n=None):
+        # Cópia das n amostras mais recentes, em ordem cronológica
+        with self.lock:
+            older, newer = self.segments()
+            n = len(older) + len(newer) if n is None else min(n, len(older) + len(newer))
+            if n <= len(newer):
+                return newer[len(newer) - n:].copy()
+            return np.concatenate([older[len(older) - (n - len(newer)):], newer])
+
+    def window(self, duration):
+        # Amostras dos últimos `duration` segundos do sinal; a busca binária
+        # nos dois trechos evita copiar o histórico inteiro a cada quadro
+        with self.lock:
+            older, newer = self.segments()
+            if len(older) == 0:
+                return older.copy()
+            cutoff = (newer if len(newer) else older)[-1, 0] - duration
+            if len(newer) and newer[0, 0] >= cutoff or not len(newer):
+                start = np.searchsorted(older[:, 0], cutoff)
+                return np.concatenate([older[start:], newer])
+            return newer[np.searchsorted(newer[:, 0], cutoff):].copy()
+
+
+def load_recording(path):
+    # Arquivos gravados por simulation.py: a primeira curva de PA e a de FC
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return data["t"], np.atleast_2d(data["bp"])[0], np.atleast_2d(data["hr"])[0]
+    if path.endswith(".npy"):
+        data = np.load(path)
+    else:
+        with open(path, newline="") as f:
+            header = next(csv.reader(f))
+            data = np.loadtxt(f, delimiter=",", ndmin=2).T
+        return data[0], data[1], data[1 + (len(header) - 1) // 2]
+    drugs = (len(data) - 1) // 2
+    return data[0], data[1], data[1 + drugs]
+
+
+class Source:
+    # Fonte de amostras numa thread própria; só escreve no buffer
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.running = False
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.guarded_run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def guarded_run(self):
+        try:
+            self.run()
+        except (OSError, ValueError) as error:
+            self.error = error
+        self.running = False
+
+
+class ReplaySource(Source):
+    # Reproduz uma gravação em tempo real (ou acelerada), entregando em cada
+    # passo as amostras cujo tempo já passou
+    def __init__(self, buffer, t, bp, hr, speed=1.0, loop=False):
+        super().__init__(buffer)
+        self.samples = np.column_stack([t - t[0], bp, hr])
+        self.speed = speed
+        self.loop = loop
+
+    def run(self):
+        start, sent, offset = time.monotonic(), 0, 0.0
+        duration = self.samples[-1, 0]
+        while self.running:
+            elapsed = (time.monotonic() - start) * self.speed - offset
+            end = int(np.searchsorted(self.samples[:, 0], elapsed, side="right"))
+            if end > sent:
+                chunk = self.samples[sent:end].copy()
+                chunk[:, 0] += offset
+                self.buffer.extend(chunk)
+                sent = end
+            if sent == len(self.samples):
+                if not self.loop:
+                    return
+                offset += duration + (self.samples[1, 0] if len(self.samples) > 1 else 0.0)
+                sent = 0
+            time.sleep(0.01)
+
+
+class StreamSource(Source):
+    # Lê registros binários (tempo, PA, FC) de um pipe ou socket
+    def __init__(self, buffer, stream, connection=None):
+        super().__init__(buffer)
+        self.stream = stream
+        self.connection = connection
+
+    def stop(self):
+        super().stop()
+        if self.connection is not None:
+            # Desbloqueia a leitura pendente na thread da fonte
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        pending = b""
+        while self.running:
+            data = self.stream.read1(65536) if hasattr(self.stream, "read1") else self.stream.read(65536)
+            if not data:
+                return
+            pending += data
+            usable = len(pending) - len(pending) % RECORD_SIZE
+            if usable:
+                self.buffer.extend(np.frombuffer(pending[:usable], dtype=RECORD).reshape(-1, 3))
+                pending = pending[usable:]
+
+
+class TcpSource(StreamSource):
+    # Conecta dentro da thread da fonte, e não na da interface; uma falha de
+    # conexão chega pelo mesmo caminho dos erros de leitura
+    def __init__(self, buffer, address, timeout=CONNECT_TIMEOUT):
+        super().__init__(buffer, None)
+        self.address = address
+        self.timeout = timeout
+
+    def run(self):
+        try:
+            connection = socket.create_connection(self.address, timeout=self.timeout)
+        except socket.timeout:
+            raise OSError(f"{self.address[0]}:{self.address[1]} não respondeu em {self.timeout:g} s") from None
+        connection.settimeout(None)
+        self.connection, self.stream = connection, connection.makefile("rb")
+        if not self.running:
+            # stop() chamado durante a conexão
+            connection.close()
+            return
+        super().run()
+
+
+def open_source(spec, buffer):
+    # "-" lê da entrada padrão, "tcp://máquina:porta" conecta a um servidor e
+    # qualquer outro valor é uma gravação reproduzida em tempo real
+    if spec == "-":
+        return StreamSource(buffer, sys.stdin.buffer)
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://"):].rpartition(":")
+        return TcpSource(buffer, (host or "localhost", int(port)))
+    return ReplaySource(buffer, *load_recording(spec))
+
+
+def demo_samples(drug, rate, duration=10.0):
+    # Sinal de bancada simulado: curvas da droga repetidas, com ruído de aquisição
+    drug = resolve_drug(drug)
+    t = np.arange(int(duration * rate)) / rate
+    rng = np.random.default_rng()
+    bp = BP_CURVES.evaluate_one(drug, t) + rng.normal(0, 1.0, len(t))
+    hr = HR_CURVES.evaluate_one(drug, t) + rng.normal(0, 0.5, len(t))
+    return t, bp, hr
+
+
+def stream_samples(write, t, bp, hr, rate, loop=True):
+    # Envia em blocos de 10 ms, no ritmo do relógio, como faria uma placa de aquisição
+    block = max(1, rate // 100)
+    period = t[-1] + 1 / rate
+    start, offset, k = time.monotonic(), 0.0, 0
+    while True:
+        chunk = np.column_stack([t[k:k + block] + offset, bp[k:k + block], hr[k:k + block]]).astype(RECORD)
+        write(chunk.tobytes())
+        k += block
+        if k >= len(t):
+            if not loop:
+                return
+            k, offset = 0, offset + period
+        delay = start + offset + t[min(k, len(t) - 1)] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Substituto de uma placa de aquisição: transmite PA e FC em tempo real.")
+    parser.add_argument("drug", nargs="?", default="Noradrenalina 20mcg", help="Droga cujas curvas são transmitidas.")
+    parser.add_argument("--recording", help="Gravação (.csv, .npy ou .npz) transmitida no lugar das curvas.")
+    parser.add_argument("--rate", type=int, default=1000, help="Amostras por segundo das curvas simuladas.")
+    parser.add_argument("--port", type=int, help="Aceita conexões TCP nesta porta; sem ela, escreve na saída padrão.")
+    args = parser.parse_args(argv)
+
+    t, bp, hr = load_recording(args.recording) if args.recording else demo_samples(args.drug, args.rate)
+    rate = args.rate if not args.recording else int(round(1 / np.median(np.diff(t))))
+    if args.port is None:
+        try:
+            stream_samples(lambda data: (sys.stdout.buffer.write(data), sys.stdout.buffer.flush()), t, bp, hr, rate)
+        except BrokenPipeError:
+            pass
+        return 0
+    server = socket.create_server(("localhost", args.port))
+    while True:
+        connection, _ = server.accept()
+        threading.Thread(target=serve_connection, args=(connection, t, bp, hr, rate), daemon=True).start()
+
+
+def serve_connection(connection, t, bp, hr, rate):
+    with connection:
+        try:
+            stream_samples(connection.sendall, t, bp, hr, rate)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
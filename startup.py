@@ -0,0 +1,27 @@
+import sys
+import time
+
+
+class StartupTimer:
+    # Fases consecutivas da inicialização: cada marca mede o tempo desde a
+    # anterior, a partir do primeiro import deste módulo
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.start))
+        self.last = now
+
+    def report(self):
+        lines = [f"  {'fase':<20} {'duração':>8} {'total':>8}  (ms)"]
+        lines += [f"  {phase:<20} {duration * 1000:8.1f} {elapsed * 1000:8.1f}" for phase, duration, elapsed in self.phases]
+        return "\n".join(lines)
+
+    def print_report(self, file=sys.stderr):
+        print(self.report(), file=file)
+
+
+STARTUP = StartupTimer()
@@ -0,0 +1,223 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from drugs import BP_CURVES, HR_CURVES, BASELINE_BP, BASELINE_HR, DRUGS, parse_dose, resolve_drug
+from metrics import METRICS, compute_metrics, format_value
+from pkpd import PKPDModel, REFERENCE_WEIGHT, reference_dose
+from protocol import saturating_scale
+from simulation import MODELS, model_version, time_grid
+
+# Eixos da varredura, na ordem do arquivo de saída: cada ponto é uma
+# combinação de dose (mg), peso (kg) e linhas de base de PA e FC
+AXES = ("dose", "weight", "baseline_bp", "baseline_hr")
+AXIS_TITLES = {"dose": "Dose (mg)", "weight": "Peso (kg)", "baseline_bp": "PA basal (mmHg)", "baseline_hr": "FC basal (BPM)"}
+CHUNK = 4096  # pontos por tarefa: poucas centenas de ms de trabalho para cada processo
+OUTPUT = np.dtype("<f4")
+
+_models = {}  # PKPDModel por droga, criado uma vez em cada processo
+
+
+def parse_grid(text, dose=False):
+    # "a:b:n" são n valores igualmente espaçados de a a b, "a:b:n:log" em
+    # escala geométrica; um valor isolado vale por si. Doses aceitam unidades
+    # ("5mcg:500mcg:40:log"); sem unidade, o valor está em mg.
+    def value(field):
+        parsed = parse_dose(field) if dose else None
+        return parsed if parsed is not None else float(field.replace(",", "."))
+    fields = text.split(":")
+    if len(fields) == 1:
+        return np.array([value(fields[0])])
+    if len(fields) not in (3, 4) or (len(fields) == 4 and fields[3] != "log"):
+        raise ValueError(f"Grade inválida: {text!r} (esperado 'início:fim:n' ou 'início:fim:n:log')")
+    start, stop, count = value(fields[0]), value(fields[1]), int(fields[2])
+    if count < 1:
+        raise ValueError(f"Grade inválida: {text!r} (n deve ser positivo)")
+    if len(fields) == 4:
+        if start <= 0 or stop <= 0:
+            raise ValueError(f"Grade inválida: {text!r} (escala geométrica exige valores positivos)")
+        return np.geomspace(start, stop, count)
+    return np.linspace(start, stop, count)
+
+
+def grid_values(texts, dose=False):
+    values = np.unique(np.concatenate([parse_grid(text, dose) for text in texts]))
+    if np.any(values <= 0):
+        raise ValueError("Os valores da grade devem ser positivos")
+    return values
+
+
+def sweep_points(drug, model, grids, t, indices):
+    # PA e FC, (n_pontos, n_amostras), dos pontos de índices planos `indices`
+    # da grade. Os parâmetros são reconstruídos no próprio processo a partir
+    # dos índices, de modo que nenhuma matriz grande passa entre processos.
+    dose, weight, baseline_bp, baseline_hr = (grid[i] for grid, i in
+                                              zip(grids, np.unravel_index(indices, [len(grid) for grid in grids])))
+    if model == "pkpd":
+        if drug not in _models:
+            _models[drug] = PKPDModel([drug])
+        _, bp, hr = _models[drug].simulate(t[-1], t[1] - t[0], doses=dose[:, None], weights=weight,
+                                           baseline_bp=baseline_bp, baseline_hr=baseline_hr)
+        return baseline_bp, bp, hr
+    # Nas curvas desenhadas, a resposta satura com a dose por kg relativa à do
+    # rótulo num cão de 10 kg, como nos protocolos e no modo população
+    scale = saturating_scale(dose / reference_dose(drug) * REFERENCE_WEIGHT / weight)[:, None]
+    bp = baseline_bp[:, None] + scale * (BP_CURVES.evaluate_one(drug, t) - BASELINE_BP)[None, :]
+    hr = baseline_hr[:, None] + scale * (HR_CURVES.evaluate_one(drug, t) - BASELINE_HR)[None, :]
+    return baseline_bp, bp, hr
+
+
+def run_chunk(path, drug, model, grids, duration, resolution, start, stop):
+    # Executado nos processos de trabalho: simula o trecho [start, stop) e
+    # escreve as métricas direto no arquivo mapeado; só a contagem volta
+    t = time_grid(duration, resolution)
+    baseline_bp, bp, hr = sweep_points(drug, model, grids, t, np.arange(start, stop))
+    metrics = compute_metrics(t, bp, hr, baseline_bp)
+    output = np.load(path, mmap_mode="r+")
+    output[start:stop] = np.column_stack([metrics[name] for name, _ in METRICS])
+    output.flush()
+    return stop - start
+
+
+def run_sweep(path, drug, grids, model="pkpd", duration=10.0, resolution=0.1, workers=None, chunk=CHUNK, progress=None):
+    # Varredura completa gravada em path (.npy com uma linha de métricas por
+    # ponto, na ordem de AXES) e descrita em path + ".json"
+    drug = resolve_drug(drug)
+    grids = [np.asarray(grid, dtype=float) for grid in grids]
+    total = int(np.prod([len(grid) for grid in grids]))
+    output = np.lib.format.open_memmap(path, mode="w+", dtype=OUTPUT, shape=(total, len(METRICS)))
+    output[:] = np.nan
+    output.flush()
+    del output
+    header = dict(drug=drug, model=model, model_version=model_version(model), duration=duration, resolution=resolution,
+                  axes=list(AXES), grids={axis: grid.tolist() for axis, grid in zip(AXES, grids)},
+                  metrics=[name for name, _ in METRICS])
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+
+    tasks = [(start, min(start + chunk, total)) for start in range(0, total, chunk)]
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    if workers == 1:
+        # Sem pool: mesmo resultado, sem o custo de iniciar processos
+        for start, stop in tasks:
+            done += run_chunk(path, drug, model, grids, duration, resolution, start, stop)
+            if progress:
+                progress(done, total)
+        return total
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        futures = [pool.submit(run_chunk, path, drug, model, grids, duration, resolution, start, stop) for start, stop in tasks]
+        for future in as_completed(futures):
+            done += future.result()
+            if progress:
+                progress(done, total)
+    return total
+
+
+def load_sweep(path):
+    # (cabeçalho, métricas com forma (dose, peso, PA basal, FC basal, métrica)) sem ler o arquivo inteiro
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    shape = [len(header["grids"][axis]) for axis in header["axes"]]
+    return header, np.load(path, mmap_mode="r").reshape(*shape, len(header["metrics"]))
+
+
+def response_table(header, values, axis="dose"):
+    # Curva dose-resposta (ou peso-resposta etc.): mediana de cada métrica
+    # sobre os demais eixos, e os percentis 5 e 95 entre eles
+    position = header["axes"].index(axis)
+    rows = np.moveaxis(values, position, 0).reshape(values.shape[position], -1, values.shape[-1])
+    with warnings.catch_warnings():
+        # Métricas indefinidas em todos os pontos (ex.: recuperação de bloqueadores) ficam NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, median, high = np.nanpercentile(rows, (5, 50, 95), axis=1)
+    return np.asarray(header["grids"][axis]), low, median, high
+
+
+def plot_response(path, header, axis, x, low, median, high):
+    # Figura sem interface gráfica, como em comparison.py
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(12, 4), dpi=100)
+    FigureCanvasAgg(fig)
+    names = [name for name, _ in METRICS]
+    titles = dict(METRICS)
+    for ax, metrics in zip(fig.subplots(1, 3), (("bp_peak", "bp_nadir"), ("hr_max", "hr_min"), ("bp_area",))):
+        for name in metrics:
+            k = names.index(name)
+            line, = ax.plot(x, median[:, k], label=titles[name])
+            if np.any(high[:, k] > low[:, k]):
+                ax.fill_between(x, low[:, k], high[:, k], color=line.get_color(), alpha=0.2)
+        if axis == "dose" and x.min() > 0 and x.max() / x.min() > 20:
+            ax.set_xscale("log")
+        ax.set_xlabel(AXIS_TITLES[axis])
+        ax.legend(fontsize=8)
+    fig.suptitle(f"{header['drug']} ({header['model']})")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Varredura de dose, peso e linhas de base para uma droga, em paralelo.")
+    parser.add_argument("drug", help="Droga varrida (nome completo ou início do nome).")
+    parser.add_argument("--doses", nargs="+", help="Grades de dose ('0,1mg:10mg:40:log', '20mcg', ...). Padrão: 1/10 a 10 vezes a do rótulo.")
+    parser.add_argument("--weights", nargs="+", default=[str(REFERENCE_WEIGHT)], help="Grades de peso em kg ('5:30:26').")
+    parser.add_argument("--baseline-bp", nargs="+", default=[str(BASELINE_BP)], help="Grades de PA basal em mmHg.")
+    parser.add_argument("--baseline-hr", nargs="+", default=[str(BASELINE_HR)], help="Grades de FC basal em BPM.")
+    parser.add_argument("--model", choices=MODELS, default="pkpd", help="Modelo PK/PD (padrão) ou curvas desenhadas com escala da dose.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duração simulada de cada ponto (s).")
+    parser.add_argument("--resolution", type=float, default=0.1, help="Passo de tempo (s).")
+    parser.add_argument("--workers", type=int, help="Processos de trabalho. Padrão: um por núcleo.")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="Pontos por tarefa.")
+    parser.add_argument("--by", choices=AXES, default="dose", help="Eixo da tabela de resposta.")
+    parser.add_argument("-o", "--output", default="varredura.npy", help="Métricas de cada ponto (.npy mapeado em memória, com .json ao lado).")
+    parser.add_argument("--table", help="Grava a tabela de resposta em CSV em vez de mostrá-la.")
+    parser.add_argument("--plot", help="Figura PNG com as curvas de resposta.")
+    args = parser.parse_args(argv)
+    try:
+        drug = resolve_drug(args.drug)
+        doses = (grid_values(args.doses, dose=True) if args.doses else
+                 np.geomspace(reference_dose(drug) / 10, reference_dose(drug) * 10, 41))
+        grids = [doses, grid_values(args.weights), grid_values(args.baseline_bp), grid_values(args.baseline_hr)]
+        time_grid(args.duration, args.resolution)  # valida a duração e a resolução
+        if args.chunk < 1:
+            raise ValueError("--chunk deve ser positivo")
+    except ValueError as error:
+        parser.error(str(error))
+
+    total = int(np.prod([len(grid) for grid in grids]))
+    print(f"{DRUGS[drug].name}: {total} pontos ({' × '.join(str(len(grid)) for grid in grids)}), modelo {args.model}",
+          file=sys.stderr)
+    started = time.perf_counter()
+    run_sweep(args.output, drug, grids, args.model, args.duration, args.resolution, args.workers, args.chunk,
+              progress=lambda done, total: print(f"\r{done}/{total}", end="", file=sys.stderr))
+    elapsed = time.perf_counter() - started
+    print(f"\r{total} pontos em {elapsed:.1f} s ({total / elapsed:.0f} pontos/s)", file=sys.stderr)
+
+    header, values = load_sweep(args.output)
+    x, low, median, high = response_table(header, values, args.by)
+    titles = [title for _, title in METRICS]
+    rows = [[f"{value:.4g}"] + [format_value(v) for v in row] for value, row in zip(x, median)]
+    if args.plot:
+        plot_response(args.plot, header, args.by, x, low, median, high)
+    if args.table:
+        with open(args.table, "w", newline="") as f:
+            csv.writer(f).writerows([[AXIS_TITLES[args.by]] + titles] + rows)
+        return 0
+    # Medianas sobre os demais eixos; a faixa entre os percentis 5 e 95 aparece na figura
+    width = max(len(AXIS_TITLES[args.by]), *(len(row[0]) for row in rows))
+    print(f"{AXIS_TITLES[args.by]:<{width}}  " + "  ".join(titles))
+    for row in rows:
+        print(f"{row[0]:<{width}}  " + "  ".join(f"{value:>{len(title)}}" for value, title in zip(row[1:], titles)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
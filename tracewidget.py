@@ -0,0 +1,200 @@
+import numpy as np
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPixmap, QPolygonF
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from graphcurves import BloodPressureCurve, HeartRateCurve
+from instrumentation import profiled
+
+LINE_COLOR = QColor("#1f77b4")  # a mesma cor padrão dos gráficos do matplotlib
+MARGINS = (90, 50, 20, 45)  # px: esquerda, topo, direita, base
+TICK_SPACING = (100, 35)  # px mínimos entre marcações em x e em y
+
+
+def nice_ticks(low, high, count=5):
+    # Marcações em múltiplos de 1, 2 ou 5 vezes uma potência de 10
+    if high <= low:
+        return np.array([low])
+    raw = (high - low) / count
+    magnitude = 10 ** np.floor(np.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    return np.arange(np.ceil(low / step) * step, high + step * 1e-9, step)
+
+
+def reserve(buffer, size):
+    # Buffer (capacidade, 2) reaproveitado entre quadros; só cresce, dobrando
+    if len(buffer) < size:
+        buffer = np.empty((max(size, 2 * len(buffer)), 2))
+    return buffer
+
+
+def fill_polygon(polygon, data, scale, offset):
+    # Escreve as coordenadas em pixels (dados * escala + deslocamento) direto
+    # na memória do QPolygonF, sem criar um QPointF por ponto nem matrizes
+    # intermediárias. remove() e fill() mudam o tamanho sem devolver a memória
+    # reservada, então depois do maior quadro o polígono não é mais realocado.
+    if polygon.size() > len(data):
+        polygon.remove(len(data), polygon.size() - len(data))
+    elif polygon.size() < len(data):
+        polygon.fill(QPointF(), len(data))
+    pointer = polygon.data()
+    pointer.setsize(len(data) * 2 * np.dtype(float).itemsize)
+    points = np.frombuffer(pointer, dtype=float).reshape(-1, 2)
+    np.multiply(data, scale, out=points)
+    points += offset
+
+
+class TraceWidget(QWidget):
+    # Alternativa leve aos gráficos do matplotlib: o traço é desenhado com
+    # QPainter sobre uma camada fixa (grade, eixos e títulos) guardada como
+    # pixmap e refeita só quando os limites ou o tamanho mudam. Mesmos
+    # ganchos de desenho de BlitGraph, com as curvas e o avanço no tempo de
+    # graphcurves.py; o matplotlib fica para a exportação em PDF.
+    def __init__(self, title, unit, xlabel='', parent=None):
+        super().__init__(parent)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setMinimumSize(200, 150)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.title = title
+        self.unit = unit
+        self.xlabel = xlabel
+        self.xlim = (0.0, 10.0)
+        self.ylim = (0.0, 200.0)
+        self.background = None
+        # Pontos da curva e contorno da faixa em buffers fixos, só com as
+        # primeiras line_size e band_size linhas válidas
+        self.line_buffer = np.empty((0, 2))
+        self.line_size = 0
+        self.band_buffer = np.empty((0, 2))
+        self.band_size = 0
+        self.line_polygon = QPolygonF()
+        self.band_polygon = QPolygonF()
+
+    def plot_rect(self):
+        left, top, right, bottom = MARGINS
+        return QRectF(left, top, max(self.width() - left - right, 1), max(self.height() - top - bottom, 1))
+
+    def set_axes(self, xlim=None, ylim=None):
+        self.xlim = self.xlim if xlim is None else (float(xlim[0]), float(xlim[1]))
+        self.ylim = self.ylim if ylim is None else (float(ylim[0]), float(ylim[1]))
+        self.background = None
+
+    def resizeEvent(self, event):
+        self.background = None
+        super().resizeEvent(event)
+
+    def render_background(self):
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.white)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        plot = self.plot_rect()
+        x_ticks = nice_ticks(*self.xlim, max(int(plot.width() / TICK_SPACING[0]), 2))
+        y_ticks = nice_ticks(*self.ylim, max(int(plot.height() / TICK_SPACING[1]), 2))
+        to_x, to_y = self.mapping(plot)
+        painter.setPen(QPen(QColor(225, 225, 225), 1))
+        for x in to_x(x_ticks):
+            painter.drawLine(QPointF(x, plot.top()), QPointF(x, plot.bottom()))
+        for y in to_y(y_ticks):
+            painter.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))
+        painter.setPen(QPen(Qt.black, 1))
+        painter.drawRect(plot)
+        painter.setFont(QFont(self.font().family(), 11))
+        for value, x in zip(x_ticks, to_x(x_ticks)):
+            painter.drawText(QRectF(x - 40, plot.bottom() + 4, 80, 20), Qt.AlignHCenter | Qt.AlignTop, f"{value:g}")
+        for value, y in zip(y_ticks, to_y(y_ticks)):
+            painter.drawText(QRectF(0, y - 10, plot.left() - 6, 20), Qt.AlignRight | Qt.AlignVCenter, f"{value:g}")
+        painter.setFont(QFont(self.font().family(), 15))
+        painter.drawText(QRectF(plot.left(), 0, plot.width(), plot.top()), Qt.AlignHCenter | Qt.AlignVCenter, self.title)
+        painter.setFont(QFont(self.font().family(), 13))
+        if self.xlabel:
+            painter.drawText(QRectF(plot.left(), plot.bottom() + 22, plot.width(), 22), Qt.AlignHCenter, self.xlabel)
+        painter.translate(18, plot.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRectF(-self.height() / 2, -12, self.height(), 24), Qt.AlignCenter, self.unit)
+        painter.end()
+        return pixmap
+
+    def transform(self, plot):
+        # Escala e deslocamento por eixo das coordenadas dos dados para pixels
+        (x0, x1), (y0, y1) = self.xlim, self.ylim
+        sx, sy = plot.width() / ((x1 - x0) or 1), plot.height() / ((y1 - y0) or 1)
+        return np.array([sx, -sy]), np.array([plot.left() - x0 * sx, plot.bottom() + y0 * sy])
+
+    def mapping(self, plot):
+        # Funções vetorizadas de coordenadas dos dados para pixels
+        scale, offset = self.transform(plot)
+        return (lambda x: np.asarray(x) * scale[0] + offset[0],
+                lambda y: np.asarray(y) * scale[1] + offset[1])
+
+    @profiled("TraceWidget.paintEvent")
+    def paintEvent(self, event):
+        if self.background is None:
+            self.background = self.render_background()
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.background)
+        plot = self.plot_rect()
+        painter.setClipRect(plot)
+        scale, offset = self.transform(plot)
+        if self.band_size >= 4:
+            band = QColor(LINE_COLOR)
+            band.setAlphaF(0.3)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(band)
+            fill_polygon(self.band_polygon, self.band_buffer[:self.band_size], scale, offset)
+            painter.drawPolygon(self.band_polygon)
+        if self.line_size >= 2:
+            # Curvas densas (dois pontos por pixel depois da redução) com traço
+            # de 1 px e sem suavização: a imagem quase não muda, e um traço
+            # largo sobre o zigue-zague de mínimos e máximos custa centenas de
+            # ms no QPainter. Curvas esparsas ficam com 2 px suavizados.
+            dense = self.line_size >= plot.width()
+            painter.setRenderHint(QPainter.Antialiasing, not dense)
+            painter.setPen(QPen(LINE_COLOR, 1 if dense else 2))
+            fill_polygon(self.line_polygon, self.line_buffer[:self.line_size], scale, offset)
+            painter.drawPolyline(self.line_polygon)
+        painter.end()
+
+    def set_line(self, x, y):
+        self.line_size = len(x)
+        self.line_buffer = reserve(self.line_buffer, self.line_size)
+        self.line_buffer[:self.line_size, 0] = x
+        self.line_buffer[:self.line_size, 1] = y
+
+    def clear_band(self):
+        self.band_size = 0
+
+    def set_band_trace(self, t, low, high):
+        # Contorno fechado: limite superior na ida e inferior na volta
+        n = len(t)
+        self.band_size = 2 * n
+        self.band_buffer = reserve(self.band_buffer, self.band_size)
+        self.band_buffer[:n, 0] = t
+        self.band_buffer[:n, 1] = high
+        self.band_buffer[n:2 * n, 0] = t[::-1]
+        self.band_buffer[n:2 * n, 1] = low[::-1]
+
+    def get_ylim(self):
+        return self.ylim
+
+    def redraw(self):
+        self.update()
+
+    def draw_frame(self):
+        # Só agenda a pintura: vários avanços no mesmo ciclo viram um único quadro
+        self.update()
+
+
+class HeartRateTrace(HeartRateCurve, TraceWidget):
+    def __init__(self, parent=None):
+        super().__init__('Variação da Frequência Cardíaca', 'BPM', parent=parent)
+        self.set_axes((0, 10), (60, 200))
+        self.init_curve()
+
+
+class BloodPressureTrace(BloodPressureCurve, TraceWidget):
+    def __init__(self, parent=None):
+        super().__init__('Efeito da Droga na Pressão Arterial', 'mmHg', 'Tempo', parent=parent)
+        self.init_curve()
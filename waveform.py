@@ -0,0 +1,85 @@
+import argparse
+import sys
+
+import numpy as np
+
+from drugs import BASELINE_BP, resolve_drug
+from metrics import trapezoid
+from simulation import drug_vertices
+
+DEFAULT_RATE = 500  # Hz
+PULSE_PRESSURE = 40.0  # mmHg entre sístole e diástole com a PA média na linha de base
+
+
+def pulse_shape(samples=512):
+    # Um ciclo do pulso arterial em função da fase do batimento (0 a 1): subida
+    # sistólica rápida, queda exponencial com a onda dicrótica e volta ao
+    # valor inicial, para que batimentos seguidos se emendem sem degrau
+    phase = np.linspace(0, 1, samples)
+    upstroke = 0.12
+    shape = np.where(phase < upstroke, np.sin(np.pi / 2 * phase / upstroke) ** 2,
+                     np.exp(-(phase - upstroke) / 0.35))
+    shape += 0.15 * np.exp(-((phase - 0.4) / 0.04) ** 2)
+    shape -= phase * shape[-1]
+    return phase, shape / shape.max()
+
+
+SHAPE_PHASE, SHAPE = pulse_shape()
+SHAPE_MEAN = trapezoid(SHAPE[None, :], SHAPE_PHASE)[0]
+
+
+def synthesize(bp_t, bp, hr_t, hr, rate=DEFAULT_RATE, start=None, end=None, phase=0.0):
+    # Onda de pressão amostrada a `rate` Hz entre start e end. A PA média vem
+    # da curva bp e os batimentos da fase acumulada da FC; tudo é calculado de
+    # uma vez sobre a grade inteira, sem laço por batimento. Devolve também a
+    # fase final, para continuar a onda num bloco seguinte sem salto.
+    start = min(bp_t[0], hr_t[0]) if start is None else start
+    end = max(bp_t[-1], hr_t[-1]) if end is None else end
+    # Tolerância no arredondamento: blocos seguidos não podem perder a última amostra
+    t = start + np.arange(int(np.floor((end - start) * rate + 1e-6)) + 1) / rate
+    beats = phase + np.cumsum(np.interp(t, hr_t, hr)) / (60 * rate)
+    mean = np.interp(t, bp_t, bp)
+    pulse = np.interp(beats % 1.0, SHAPE_PHASE, SHAPE) - SHAPE_MEAN
+    pressure = mean + PULSE_PRESSURE * mean / BASELINE_BP * pulse
+    return t, pressure.astype(np.float32), (beats[-1] if len(beats) else phase)
+
+
+class PulseSynthesizer:
+    # Onda gerada aos poucos, conforme chegam as amostras (t, PA, FC) do modo
+    # contínuo; a fase e a última amostra passam de um bloco para o outro
+    def __init__(self, rate=DEFAULT_RATE):
+        self.rate = rate
+        self.time = None
+        self.phase = 0.0
+        self.last = None
+
+    def generate(self, t, bp, hr):
+        if self.last is not None:
+            t, bp, hr = (np.concatenate([[previous], values]) for previous, values in zip(self.last, (t, bp, hr)))
+        self.last = (t[-1], bp[-1], hr[-1])
+        start = t[0] if self.time is None else self.time
+        if t[-1] < start:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        wave_t, pressure, self.phase = synthesize(t, bp, t, hr, self.rate, start, t[-1], self.phase)
+        self.time = wave_t[-1] + 1 / self.rate
+        return wave_t, pressure
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera a onda de pressão arterial, batimento a batimento, para uma droga.")
+    parser.add_argument("drug", nargs="?", default="Nenhuma", help="Droga cujas curvas de PA e FC modulam a onda.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duração em segundos.")
+    parser.add_argument("--rate", type=int, default=DEFAULT_RATE, help="Amostras por segundo (250 a 1000 Hz é o usual).")
+    parser.add_argument("-o", "--output", default="onda.npy", help="Arquivo .npy com as colunas tempo e pressão.")
+    args = parser.parse_args(argv)
+    try:
+        drug = resolve_drug(args.drug) if args.drug != "Nenhuma" else args.drug
+    except ValueError as error:
+        parser.error(str(error))
+    t, pressure, _ = synthesize(*drug_vertices("bp", drug, args.duration), *drug_vertices("hr", drug, args.duration), args.rate)
+    np.save(args.output, np.column_stack([t, pressure]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())